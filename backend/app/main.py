@@ -6,24 +6,245 @@ using a RAG system. It supports multiple document formats and provides semantic
 search capabilities with AI-powered answer generation.
 """
 
-from fastapi import FastAPI, UploadFile, Form, HTTPException
+from fastapi import FastAPI, UploadFile, Form, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from core.memory.memory_manager import MemoryManager
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from core.memory.hit import Hit
+from core.memory.memory_manager import MemoryManager, DEFAULT_NPROBE
 from core.memory.lexical_store import LexicalStore
+from core.memory.search_batcher import SearchBatcher
 from core.splitters import recursive_token_split
 from core.embeddings import embed_chunks
-from utils.io import read_text_from_path, save_upload
-from core.LLM.llm_engine import generate_answer, enrich_query
+from core.openai_client import get_client, close_http_client
+from core.reranker import rerank_results, rerank_candidates
+from utils.io import read_text_from_path, save_upload, SUPPORTED_EXTENSIONS
+from core.LLM.llm_engine import generate_answer, stream_answer, enrich_query, response_cache, check_prompt_budget
 from core.memory.conversation_memory import ConversationMemory
 import numpy as np
+import asyncio
+import logging
+import logging.handlers
+import orjson
 import os
+import queue
+from contextlib import asynccontextmanager
+from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Get absolute paths
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+FAISS_PATH = str(PROJECT_ROOT / "data" / "index" / "index.faiss")
+SQLITE_PATH = str(PROJECT_ROOT / "data" / "index" / "chunks.db")
+UPLOAD_DIR = str(PROJECT_ROOT / "data" / "uploads")
+
+# Initialize conversation memory for each session
+session_conversation_memory = {}
+
+# Ingestion progress per upload, keyed by upload ID; entries expire INGEST_STATUS_TTL seconds
+# after their last update, and the oldest are evicted beyond INGEST_STATUS_MAX_ENTRIES
+INGEST_STATUS_TTL = 3600
+INGEST_STATUS_MAX_ENTRIES = 1024
+ingest_status: TTLCache[str, dict] = TTLCache(maxsize=INGEST_STATUS_MAX_ENTRIES, ttl=INGEST_STATUS_TTL)
+
+# Serializes index writes from concurrent background ingests
+ingest_lock = asyncio.Lock()
+
+# Chunks embedded and indexed per step of the ingestion pipeline
+INGEST_BATCH_CHUNKS = 256
+
+# Set while SQLite holds chunks without vectors in the FAISS index (see recover_missing_vectors)
+vectors_missing = False
+recovery_lock = asyncio.Lock()
+recovery_task: asyncio.Task | None = None
+
+
+@lru_cache(maxsize=1)
+def get_memory() -> MemoryManager:
+    """Return the process-wide memory manager (FAISS index + chunk metadata)."""
+    return MemoryManager(FAISS_PATH, SQLITE_PATH)
+
+
+@lru_cache(maxsize=1)
+def get_lexical_store() -> LexicalStore:
+    """Return the process-wide BM25 lexical store."""
+    # The memory manager creates the chunks table the lexical store reads from
+    get_memory()
+    return LexicalStore(SQLITE_PATH)
+
+
+# Coalesces concurrent semantic searches into batched FAISS calls
+search_batcher = SearchBatcher(get_memory)
+
+
+async def persist_index_periodically(interval: float = 5.0) -> None:
+    """
+    Write the FAISS index to disk whenever the memory manager says a save is due.
+    
+    args:
+        interval: float: Seconds between checks
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with ingest_lock:
+                await asyncio.to_thread(get_memory().save_if_due)
+        except Exception:
+            # Keep persisting; a failed save (e.g. disk full) is retried on the next check
+            logger.exception("Failed to save the FAISS index")
+
+
+async def recover_missing_vectors(api_key: str | None = None) -> None:
+    """
+    Re-embed chunks whose vectors are missing from the FAISS index, e.g. after a crash between saves.
+    
+    Runs at startup with the OPENAI_API_KEY environment variable. Without a usable
+    key the gap is logged and vectors_missing stays set, so the next upload or query
+    that brings its own key retries the recovery with it.
+    
+    args:
+        api_key: str | None: Optional OpenAI API key
+    """
+    global vectors_missing
+    if recovery_lock.locked():
+        return
+    async with recovery_lock:
+        # Ingests write SQLite and FAISS under ingest_lock, so this sees no half-added batch
+        async with ingest_lock:
+            rows = await asyncio.to_thread(get_memory().missing_chunks)
+        vectors_missing = bool(rows)
+        if not rows:
+            return
+
+        try:
+            get_client(api_key)
+        except ValueError:
+            logger.warning("%d chunks have no vectors in the FAISS index and are excluded from semantic search; "
+                           "they will be re-embedded with the API key of the next upload or query", len(rows))
+            return
+
+        logger.warning("Re-embedding %d chunks missing from the FAISS index", len(rows))
+        try:
+            for start in range(0, len(rows), INGEST_BATCH_CHUNKS):
+                batch = rows[start:start + INGEST_BATCH_CHUNKS]
+                embeddings = await embed_chunks([content for _, content in batch], api_key=api_key)
+                ids = np.array([chunk_id for chunk_id, _ in batch], dtype=np.int64)
+                async with ingest_lock:
+                    await asyncio.to_thread(get_memory().add_vectors, embeddings, ids)
+            async with ingest_lock:
+                await asyncio.to_thread(get_memory().save_index)
+            vectors_missing = False
+            logger.info("Recovered %d chunks missing from the FAISS index", len(rows))
+        except Exception:
+            logger.exception("Failed to re-embed chunks missing from the FAISS index; retrying with the API key of the next upload or query")
+
+
+def schedule_vector_recovery(api_key: str | None) -> None:
+    """
+    Start recover_missing_vectors in the background if chunks still lack vectors.
+    
+    args:
+        api_key: str | None: API key of a request that just used it successfully
+    """
+    global recovery_task
+    if vectors_missing and not recovery_lock.locked():
+        recovery_task = asyncio.create_task(recover_missing_vectors(api_key))
+
+
+def configure_logging(level: int = logging.INFO) -> logging.handlers.QueueListener:
+    """
+    Route log records through a queue so handlers never block request handling.
+    
+    The root logger only enqueues records; a listener thread formats them and
+    writes them to stderr.
+    
+    args:
+        level: int: Minimum level for the root logger
+        
+    returns:
+        logging.handlers.QueueListener: The started listener; stop it on shutdown to flush
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Initialize storage when the server starts.
+    
+    Importing this module has no side effects; directories, the FAISS index,
+    the BM25 index and the response cache are only set up here, once per process.
+    """
+    log_listener = configure_logging()
+
+    # Change working directory to project root
+    os.chdir(PROJECT_ROOT)
+
+    # Ensure directories exist
+    os.makedirs(os.path.dirname(FAISS_PATH), exist_ok=True)
+    os.makedirs(os.path.dirname(SQLITE_PATH), exist_ok=True)
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    # Load existing index if available (the memory manager reads it on construction)
+    if get_memory().index is not None:
+        logger.info("FAISS index loaded")
+    else:
+        logger.info("No index found, starting fresh")
+
+    get_lexical_store()
+
+    # Persist cached LLM responses alongside the chunk metadata
+    response_cache.attach(SQLITE_PATH)
+
+    # Fail fast if a prompt template grew past its token budget
+    check_prompt_budget()
+
+    # Start batching semantic searches from concurrent queries
+    search_batcher.start()
+
+    # Persist index changes in batches rather than after every upload
+    saver = asyncio.create_task(persist_index_periodically())
+
+    # Restore vectors lost since the last index save, without delaying startup
+    global recovery_task
+    recovery_task = asyncio.create_task(recover_missing_vectors())
+
+    yield
+
+    recovery_task.cancel()
+    saver.cancel()
+    await search_batcher.stop()
+
+    # Final save so nothing added since the last periodic save is lost
+    async with ingest_lock:
+        await asyncio.to_thread(get_memory().flush)
+
+    # Close pooled OpenAI connections
+    await close_http_client()
+
+    log_listener.stop()
+
 
 # Initialize FastAPI application with metadata
 app = FastAPI(
     title="Cortex API",
     description="AI Document Assistant - A multi-document retrieval augmented generation system",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse  # orjson serializes the chunk-heavy /query payloads in C
 )
 
 # Configure CORS middleware to allow cross-origin requests
@@ -35,36 +256,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Get absolute paths
-PROJECT_ROOT = Path(__file__).parent.parent.parent
-FAISS_PATH = str(PROJECT_ROOT / "data" / "index" / "index.faiss")
-SQLITE_PATH = str(PROJECT_ROOT / "data" / "index" / "chunks.db")
-UPLOAD_DIR = str(PROJECT_ROOT / "data" / "uploads")
-
-# Change working directory to project root
-os.chdir(PROJECT_ROOT)
-
-# Ensure directories exist
-os.makedirs(os.path.dirname(FAISS_PATH), exist_ok=True)
-os.makedirs(os.path.dirname(SQLITE_PATH), exist_ok=True)
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-# Initialize memory manager for document storage and retrieval
-memory = MemoryManager(FAISS_PATH, SQLITE_PATH)
-
-# Initialize lexical store
-lexical_store = LexicalStore(SQLITE_PATH)
-
-# Initialize conversation memory for each session
-session_conversation_memory = {}
-
-# Load existing index if available
-if os.path.exists(FAISS_PATH):
-    memory.load_index()
-    print("FAISS index loaded")
-else: 
-    print("No index found, starting fresh")
-
 
 @app.post("/ping")
 async def ping() -> dict[str, str]:
@@ -77,118 +268,267 @@ async def ping() -> dict[str, str]:
     return {"Status": "OK"}
 
 
+async def ingest_document(path: str, upload_id: str, source_filename: str, session_id: str, api_key: str | None) -> None:
+    """
+    Extract, chunk, embed and index an uploaded document, recording progress in ingest_status.
+    
+    Runs as a background task after /upload has returned. Chunks are processed in
+    batches of INGEST_BATCH_CHUNKS, and the next batch is embedded while the current
+    one is written to the indices. Failures are stored in the upload's status
+    entry instead of being raised.
+    
+    args:
+        path: str: Path of the saved upload
+        upload_id: str: Unique ID of the upload (its status key)
+        source_filename: str: Original filename of the upload (the document ID of its chunks)
+        session_id: str: Session ID to associate this document with
+        api_key: str | None: Optional OpenAI API key
+    """
+    # Keep a reference so updates land even if the entry expires during a long ingest
+    status = ingest_status[upload_id]
+    status["status"] = "processing"
+    try:
+        # Extract text content from the file
+        text = await asyncio.to_thread(read_text_from_path, path)
+
+        # Split text into manageable chunks with overlap
+        chunks = await asyncio.to_thread(recursive_token_split, text)
+        created_at = datetime.now().isoformat()
+
+        # Embed batches ahead of the indexing below; the bounded queue keeps at most two in flight
+        embedded: asyncio.Queue = asyncio.Queue(maxsize=2)
+
+        async def embed_batches() -> None:
+            try:
+                for start in range(0, len(chunks), INGEST_BATCH_CHUNKS):
+                    batch = chunks[start:start + INGEST_BATCH_CHUNKS]
+                    await embedded.put((start, batch, await embed_chunks(batch, api_key=api_key)))
+                await embedded.put(None)
+            except Exception as e:
+                await embedded.put(e)
+
+        producer = asyncio.create_task(embed_batches())
+        try:
+            while (item := await embedded.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                start, batch, embeddings = item
+
+                # Index writes are serialized; concurrent ingests only overlap on extraction and embedding
+                async with ingest_lock:
+                    # Store chunks and embeddings in the knowledge base with session_id
+                    chunk_ids = await asyncio.to_thread(get_memory().add_document, batch, embeddings, source_filename, source_filename, session_id, start, created_at)
+
+                    # Store chunks and chunk ID in the lexical store with session_id
+                    await asyncio.to_thread(get_lexical_store().add_document, batch, chunk_ids, session_id)
+        finally:
+            producer.cancel()
+
+        status.update(status="done", chunks_added=len(chunks))
+
+        # The key just embedded a document, so use it for any chunks still missing vectors
+        schedule_vector_recovery(api_key)
+    except ValueError as e:
+        if "API key" in str(e):
+            e = ValueError("Invalid or missing API key. Please provide a valid OpenAI API key.")
+        status.update(status="failed", error=str(e))
+    except Exception as e:
+        logger.exception("Error ingesting %s", source_filename)
+        status.update(status="failed", error=f"Failed to process file: {str(e)}")
+    finally:
+        # Re-insert so a finished entry stays available for a full INGEST_STATUS_TTL
+        ingest_status[upload_id] = status
+
+
 @app.post("/upload")
-async def upload_file(file: UploadFile, session_id: str = Form(...), api_key: str = Form(None)) -> dict[str, str | int]:
+async def upload_file(file: UploadFile, background_tasks: BackgroundTasks, session_id: str = Form(...), api_key: str = Form(None)) -> dict[str, str]:
     """
-    Upload and process a document for ingestion into the RAG system.
+    Upload a document for ingestion into the RAG system.
     
-    This endpoint handles file uploads, extracts text content, splits it into chunks,
-    generates embeddings, and stores everything in the knowledge base with session isolation.
+    This endpoint saves the uploaded file and returns immediately. Text extraction,
+    chunking, embedding and indexing continue in the background with session
+    isolation; poll /status/{upload_id} to follow progress.
     
     Args:
         file (UploadFile): The uploaded file (supports .txt, .pdf, .docx)
+        background_tasks (BackgroundTasks): FastAPI background task queue
         session_id (str): Session ID to associate this document with
         api_key (str): Optional OpenAI API key. If not provided, uses environment variable.
         
     Returns:
-        dict[str, str | int]: Response containing status and number of chunks added
+        dict[str, str]: Response containing the queued status, upload ID and session ID
         
     Raises:
-        HTTPException: If file processing fails or unsupported file type
+        HTTPException: If the file type is unsupported, no API key is available, or saving fails
     """   
+    if Path(file.filename or "").suffix.lower() not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+
+    try:
+        # Reject a missing API key now rather than in the background task
+        get_client(api_key)
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Invalid or missing API key. Please provide a valid OpenAI API key.")
+
     try:
         # Save uploaded file to disk
-        path = save_upload(file, UPLOAD_DIR)
+        path = await asyncio.to_thread(save_upload, file, UPLOAD_DIR)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
 
-        # Extract text content from the file
-        text = read_text_from_path(path)
+    upload_id = Path(path).stem
+    ingest_status[upload_id] = {"status": "queued", "source_filename": file.filename, "session_id": session_id}
+    background_tasks.add_task(ingest_document, path, upload_id, file.filename, session_id, api_key)
 
-        # Split text into manageable chunks with overlap
-        chunks = recursive_token_split(text)
+    return {"status": "queued", "upload_id": upload_id, "session_id": session_id}
 
-        # Generate embeddings for each chunk
-        embeddings = np.array(embed_chunks(chunks, api_key=api_key))
 
-        # Store chunks and embeddings in the knowledge base with session_id
-        chunk_ids = memory.add_document(chunks, embeddings, doc_id=file.filename, source_filename=file.filename, session_id=session_id)
+@app.get("/status/{upload_id}")
+async def ingest_status_for(upload_id: str) -> dict[str, str | int]:
+    """
+    Report the ingestion progress of an uploaded document.
+    
+    Args:
+        upload_id (str): Upload ID returned by /upload
+        
+    Returns:
+        dict[str, str | int]: Status entry with "status" (queued, processing, done or failed),
+            plus "chunks_added" once done or "error" if failed
+        
+    Raises:
+        HTTPException: If the upload ID is unknown or its entry has expired
+    """
+    status = ingest_status.get(upload_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown upload ID")
+    return status
 
-        # Store chunks and chunk ID in the lexical store with session_id
-        lexical_store.add_document(chunks, chunk_ids, session_id) 
 
-        # Persist the updated index
-        memory.save_index()
-        return {"status": "OK", "chunks_added": len(chunks), "session_id": session_id}
-    except ValueError as e:
-        if "API key" in str(e):
-            raise HTTPException(status_code=401, detail="Invalid or missing API key. Please provide a valid OpenAI API key.")
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
 
 
+# Rank constant from the original Reciprocal Rank Fusion paper
+RRF_K = 60
 
 
-def fuse_search_results(semantic_results: list[dict], lexical_results: list[dict], k: int) -> list[dict]:
+def fuse_search_results(semantic_results: list[Hit], lexical_results: list[Hit], k: int) -> list[Hit]:
     """
     Fuse results from both semantic and lexical searches using Reciprocal Rank Fusion
     
+    Each chunk scores 1 / (RRF_K + rank + 1) summed over the result lists it appears in.
+    Scores are scaled by the best attainable score (rank 0 in both lists) so they stay
+    in the 0-1 range the frontend renders as a match percentage.
+
     args:
-        semantic_results: list[dict]: Results from the semantic search
-        lexical_results: list[dict]: Results from the lexical search
+        semantic_results: list[Hit]: Results from the semantic search
+        lexical_results: list[Hit]: Results from the lexical search
         k: int: Number of top results to return
 
     returns:
-        list[dict]: List of fused results with realistic confidence scores
-    """
-
-    fused_scores = {}
-
-    # Add semantic scores (boost to realistic range)
-    for rank, result in enumerate(semantic_results):
-        chunk_id = result["id"]
-        semantic_score = result["score"] if result["score"] <= 1.0 else result["score"] / 2.0
-        rrf_score = 1.0 / (60 + rank + 1)
-        # Boost to 60-90% range: base 0.6 + weighted score
-        combined_score = 0.6 + (semantic_score * 0.3) + (rrf_score * 0.1)
-        fused_scores[chunk_id] = {
-            "result": result,
-            "combined_score": min(combined_score, 0.95)  # Cap at 95%
-        }
-
-    # Add lexical scores (boost to realistic range)
-    for rank, result in enumerate(lexical_results):
-        chunk_id = result["id"]
-        lexical_score = min(result["score"] / 2.0, 1.0)
-        rrf_score = 1.0 / (60 + rank + 1)
-        # Boost to 60-90% range: base 0.6 + weighted score
-        combined_score = 0.6 + (lexical_score * 0.3) + (rrf_score * 0.1)
-        
-        if chunk_id in fused_scores:
-            # Average the combined scores if chunk appears in both
-            fused_scores[chunk_id]["combined_score"] = (fused_scores[chunk_id]["combined_score"] + combined_score) / 2
-        else:
-            fused_scores[chunk_id] = {
-                "result": result,
-                "combined_score": min(combined_score, 0.95)
-            }
-
-    # Sort by combined score and return with updated scores
-    sorted_results = sorted(fused_scores.values(), key=lambda x: x["combined_score"], reverse=True)
-    
-    # Update results with realistic confidence scores
+        list[Hit]: List of fused results with normalized RRF scores
+    """
+    sem_rank = {r.id: i for i, r in enumerate(semantic_results)}
+    lex_rank = {r.id: i for i, r in enumerate(lexical_results)}
+
+    # Keep one hit per chunk for the final assembly (semantic wins ties)
+    id_to_result = {r.id: r for r in lexical_results}
+    id_to_result.update((r.id, r) for r in semantic_results)
+    ids = list(id_to_result)
+
+    if not ids or k <= 0:
+        return []
+
+    # Missing ranks are infinite so they contribute exactly zero to the sum
+    ranks_sem = np.fromiter((sem_rank.get(i, np.inf) for i in ids), dtype=np.float64, count=len(ids))
+    ranks_lex = np.fromiter((lex_rank.get(i, np.inf) for i in ids), dtype=np.float64, count=len(ids))
+    scores = (1.0 / (RRF_K + ranks_sem + 1) + 1.0 / (RRF_K + ranks_lex + 1)) * ((RRF_K + 1) / 2.0)
+
+    # Partial selection of the top-k, then order only those k
+    if k < len(ids):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(ids))
+    top = top[np.argsort(-scores[top], kind="stable")]
+
+    # The hits are fresh from the retrievers and not reused, so update them in place
     fused_results = []
-    for item in sorted_results[:k]:
-        result = item["result"].copy()
-        result["score"] = item["combined_score"]
+    for i in top:
+        result = id_to_result[ids[i]]
+        result.score = float(scores[i])
         fused_results.append(result)
-    
+
     return fused_results
 
 
 
 
+async def retrieve_results(query: str, session_id: str, k: int, nprobe: int, rerank: bool, api_key: str | None, lexical: str = "bm25") -> tuple[str, list[Hit]]:
+    """
+    Run the retrieval half of the RAG pipeline for a query.
+    
+    args:
+        query: str: The user's question or query
+        session_id: str: Session ID to filter search results
+        k: int: Number of chunks to return
+        nprobe: int: IVF cells visited by semantic search on large indices
+        rerank: bool: Whether to rerank an over-fetched candidate pool with the cross-encoder
+        api_key: str | None: Optional OpenAI API key
+        lexical: str: Keyword search to fuse with the semantic search: "bm25" (the in-memory
+            index over lemmatized tokens) or "fts" (SQLite FTS5 over the raw chunk text)
+
+    returns:
+        tuple[str, list[Hit]]: The enriched query and the top-k retrieved chunks
+
+    raises:
+        ValueError: If lexical names an unknown keyword search
+    """
+    if lexical == "bm25":
+        lexical_search = get_lexical_store().search_with_session_id
+    elif lexical == "fts":
+        lexical_search = get_lexical_store().search_fts
+    else:
+        raise ValueError(f"Unsupported lexical search: {lexical}")
+
+    # Enrich the query
+    enriched_query = await enrich_query(query, api_key=api_key)
+
+    # Generate query embedding for the semantic search
+    q_emb = await embed_chunks([enriched_query], api_key=api_key)
+
+    # The key just worked, so use it for any chunks still missing vectors
+    schedule_vector_recovery(api_key)
+
+    # Over-fetch candidates when a rerank pass will pick the final k
+    n_candidates = rerank_candidates(k) if rerank else k
+
+    # Run semantic and lexical search (both session-filtered) concurrently
+    semantic_results, lexical_results = await asyncio.gather(
+        search_batcher.search_with_session_id(q_emb, session_id, n_candidates, nprobe),
+        asyncio.to_thread(lexical_search, enriched_query, session_id, n_candidates),
+    )
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Semantic scores: %s", [r.score for r in semantic_results])
+        logger.debug("Lexical scores: %s", [r.score for r in lexical_results])
+
+    # Fuse results from both searches 
+    results = fuse_search_results(semantic_results, lexical_results, k=n_candidates)
+
+    # Rescore the fused candidates with the cross-encoder and keep the top-k
+    if rerank:
+        results = await asyncio.to_thread(rerank_results, query, results, k)
+
+    return enriched_query, results
+
+
+def get_conversation_memory(session_id: str) -> ConversationMemory:
+    """Return the conversation memory for a session, creating it on first use."""
+    if session_id not in session_conversation_memory:
+        session_conversation_memory[session_id] = ConversationMemory(session_id)
+    return session_conversation_memory[session_id]
+
+
 @app.post("/query")
-async def query_rag(query: str = Form(...), k: int = 3, session_id: str = Form(...), api_key: str = Form(None)) -> dict[str, str | list[dict]]:
+async def query_rag(query: str = Form(...), k: int = 3, nprobe: int = DEFAULT_NPROBE, session_id: str = Form(...), api_key: str = Form(None), rerank: bool = Form(False), lexical: str = Form("bm25")) -> ORJSONResponse:
     """
     Query the RAG system to get an AI-generated answer based on document content.
     
@@ -198,56 +538,106 @@ async def query_rag(query: str = Form(...), k: int = 3, session_id: str = Form(.
     Args:
         query (str): The user's question or query
         k (int, optional): Number of most relevant chunks to retrieve. Defaults to 3.
+        nprobe (int, optional): IVF cells visited by semantic search on large indices. Defaults to 16.
         session_id (str): Session ID to filter search results
         api_key (str): Optional OpenAI API key. If not provided, uses environment variable.
+        rerank (bool): If true, over-fetch candidates and rerank them with a cross-encoder
+            before answer generation. Defaults to False.
+        lexical (str): Keyword search fused with the semantic search, "bm25" or "fts"
+            (SQLite FTS5). Defaults to "bm25".
         
     Returns:
-        dict[str, str | list[dict]]: Response containing:
+        ORJSONResponse: JSON response containing:
             - answer: AI-generated answer based on retrieved contexts
             - results: List of retrieved chunks with metadata and similarity scores
             
     Raises:
         HTTPException: If query processing fails or no documents are indexed
     """
-
-    if session_id not in session_conversation_memory:
-        session_conversation_memory[session_id] = ConversationMemory(session_id)
-    
-
-    convo_memory = session_conversation_memory[session_id]
+    convo_memory = get_conversation_memory(session_id)
 
     try:
-        # Enrich the query
-        enriched_query = enrich_query(query, api_key=api_key)
-
-        # Generate query embedding for the semantic search
-        q_emb = np.array(embed_chunks([enriched_query], api_key=api_key))
-        
-        # Perform semantic search with session_id filtering
-        semantic_results = memory.search_with_session_id(q_emb, session_id, k=k)
-
-        # Perform lexical search with session_id filtering
-        lexical_results = lexical_store.search_with_session_id(enriched_query, session_id, k=k)
-
-        # Fuse results from both searches 
-        results = fuse_search_results(semantic_results, lexical_results, k=k)
+        enriched_query, results = await retrieve_results(query, session_id, k, nprobe, rerank, api_key, lexical)
 
         # Extract content from search results for answer generation
-        contexts = [r["content"] for r in results]
+        contexts = [r.content for r in results]
 
 
         # Generate answer using retrieved contexts
-        answer = generate_answer(enriched_query, contexts, convo_memory, api_key=api_key)
+        answer = await generate_answer(enriched_query, contexts, convo_memory, api_key=api_key)
 
         # Add message to conversation memory
         convo_memory.add_message(query, answer)
 
-        return {"answer": answer, "results": results}
+        # Returned as a response so FastAPI doesn't re-encode the hits through jsonable_encoder;
+        # orjson serializes the Hit dataclasses natively
+        return ORJSONResponse({"answer": answer, "results": results})
 
     except ValueError as e:
         if "API key" in str(e):
             raise HTTPException(status_code=401, detail="Invalid or missing API key. Please provide a valid OpenAI API key.")
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Error querying RAG: {e}")
+        logger.exception("Error querying RAG")
         raise HTTPException(status_code=500, detail=f"Failed to query RAG: {str(e)}")
+
+
+@app.post("/query/stream")
+async def query_rag_stream(query: str = Form(...), k: int = 3, nprobe: int = DEFAULT_NPROBE, session_id: str = Form(...), api_key: str = Form(None), rerank: bool = Form(False), lexical: str = Form("bm25")) -> StreamingResponse:
+    """
+    Query the RAG system and stream the answer as it is generated.
+    
+    Retrieval runs before the response starts, so retrieval errors are still reported
+    with a proper status code. The body is newline-delimited JSON: a first line
+    {"results": [...]} with the retrieved chunks, then one {"delta": "..."} line per
+    generated text fragment. A failure during generation ends the stream with an
+    {"error": "..."} line.
+    
+    Args:
+        query (str): The user's question or query
+        k (int, optional): Number of most relevant chunks to retrieve. Defaults to 3.
+        nprobe (int, optional): IVF cells visited by semantic search on large indices. Defaults to 16.
+        session_id (str): Session ID to filter search results
+        api_key (str): Optional OpenAI API key. If not provided, uses environment variable.
+        rerank (bool): If true, over-fetch candidates and rerank them with a cross-encoder
+            before answer generation. Defaults to False.
+        lexical (str): Keyword search fused with the semantic search, "bm25" or "fts"
+            (SQLite FTS5). Defaults to "bm25".
+        
+    Returns:
+        StreamingResponse: NDJSON stream of the results and answer fragments
+            
+    Raises:
+        HTTPException: If retrieval fails or no documents are indexed
+    """
+    convo_memory = get_conversation_memory(session_id)
+
+    try:
+        enriched_query, results = await retrieve_results(query, session_id, k, nprobe, rerank, api_key, lexical)
+    except ValueError as e:
+        if "API key" in str(e):
+            raise HTTPException(status_code=401, detail="Invalid or missing API key. Please provide a valid OpenAI API key.")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Error querying RAG")
+        raise HTTPException(status_code=500, detail=f"Failed to query RAG: {str(e)}")
+
+    contexts = [r.content for r in results]
+
+    async def ndjson_lines():
+        yield orjson.dumps({"results": results}) + b"\n"
+
+        parts = []
+        try:
+            async for delta in stream_answer(enriched_query, contexts, convo_memory, api_key=api_key):
+                parts.append(delta)
+                yield orjson.dumps({"delta": delta}) + b"\n"
+        except Exception as e:
+            logger.exception("Error streaming answer")
+            yield orjson.dumps({"error": f"Failed to generate answer: {str(e)}"}) + b"\n"
+            return
+
+        # Only complete answers go into the conversation memory
+        convo_memory.add_message(query, "".join(parts).strip())
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
@@ -5,31 +5,98 @@ This module provides functionality to generate contextual answers by combining
 user queries with retrieved document contexts using OpenAI's GPT models.
 """
 
-from openai import OpenAI
-import os
+from typing import AsyncIterator
+from core.openai_client import get_client
+from core.splitters import get_encoder
 from core.memory.conversation_memory import ConversationMemory
+from core.LLM.response_cache import ResponseCache
 
 
-def get_client(api_key: str | None = None) -> OpenAI:
+# Process-wide cache of LLM responses; main.py attaches SQLite persistence at startup
+response_cache = ResponseCache(maxsize=2048)
+
+# Using GPT-4o-mini for cost efficiency
+LLM_MODEL = "gpt-4o-mini"
+
+# Output caps: an enriched query is a short expansion, answers are a few paragraphs at most
+ENRICH_MAX_TOKENS = 80
+ANSWER_MAX_TOKENS = 1024
+
+# Low temperature for more deterministic, factual answers;
+# deterministic expansions make repeated queries hit the response cache
+ANSWER_TEMPERATURE = 0.2
+ENRICH_TEMPERATURE = 0.0
+
+# Fixed sampling seed, and expansions stop at the first blank line
+LLM_SEED = 0
+ENRICH_STOP = ["\n\n"]
+
+# Prompt templates are built once at import; only the placeholders are filled per request.
+# The fixed text is kept short because it is billed as input tokens on every call.
+_ANSWER_TEMPLATE = """Answer the query using only the context below. The context may contain Q&A pairs; use them if relevant.
+
+Context:
+{contexts}
+
+Recent conversation:
+{memory}
+
+Query: {query}
+Answer:"""
+
+_ENRICH_TEMPLATE = """Expand this search query with synonyms, related terms and likely document wording. Stay on topic.
+Query: {query}
+Expanded query:"""
+
+# Token budgets for the fixed part of each template (placeholders left empty)
+ANSWER_TEMPLATE_MAX_TOKENS = 64
+ENRICH_TEMPLATE_MAX_TOKENS = 40
+
+# Fingerprints of everything besides the inputs that shapes a response, folded into
+# every cache key so a model, template or sampling change never serves stale entries
+_ANSWER_CACHE_SCOPE = ResponseCache.make_key(
+    LLM_MODEL, _ANSWER_TEMPLATE, str(ANSWER_TEMPERATURE), str(ANSWER_MAX_TOKENS), str(LLM_SEED)
+).hex()
+_ENRICH_CACHE_SCOPE = ResponseCache.make_key(
+    LLM_MODEL, _ENRICH_TEMPLATE, str(ENRICH_TEMPERATURE), str(ENRICH_MAX_TOKENS), str(LLM_SEED), *ENRICH_STOP
+).hex()
+
+
+def check_prompt_budget() -> None:
     """
-    Initialize and return an OpenAI client using the provided API key or environment variables.
+    Check that the fixed part of each prompt template stays within its token budget.
     
-    Args:
-        api_key (str | None): Optional API key. If not provided, uses OPENAI_API_KEY environment variable.
+    Called once at startup so a template edit that bloats every request is caught
+    before the server takes traffic.
     
-    Returns:
-        OpenAI: Configured OpenAI client instance
-        
     Raises:
-        ValueError: If no API key is provided and OPENAI_API_KEY environment variable is not set
+        RuntimeError: If a template exceeds its budget
     """
-    key = api_key or os.getenv("OPENAI_API_KEY")
-    if not key:
-        raise ValueError("API key is required. Provide it as a parameter or set OPENAI_API_KEY environment variable")
-    return OpenAI(api_key=key)
+    enc = get_encoder(LLM_MODEL)
+    answer_tokens = len(enc.encode(_ANSWER_TEMPLATE.format(contexts="", memory="", query="")))
+    enrich_tokens = len(enc.encode(_ENRICH_TEMPLATE.format(query="")))
+    if answer_tokens > ANSWER_TEMPLATE_MAX_TOKENS:
+        raise RuntimeError(f"Answer prompt template is {answer_tokens} tokens (budget {ANSWER_TEMPLATE_MAX_TOKENS})")
+    if enrich_tokens > ENRICH_TEMPLATE_MAX_TOKENS:
+        raise RuntimeError(f"Enrich prompt template is {enrich_tokens} tokens (budget {ENRICH_TEMPLATE_MAX_TOKENS})")
+
+
+def _answer_cache_key(query: str, contexts: list[str], recent_memory: list[dict]) -> bytes:
+    """Cache key for an answer: identical model settings, query, contexts and conversation history give the same prompt."""
+    return ResponseCache.make_key(
+        "answer", _ANSWER_CACHE_SCOPE, query, str(len(contexts)), *contexts,
+        *[part for item in recent_memory for part in (item["query"], item["response"])],
+    )
 
 
-def generate_answer(query: str, contexts: list[str], memory: ConversationMemory, api_key: str | None = None) -> str:
+def _build_answer_prompt(query: str, contexts: list[str], recent_memory: list[dict]) -> str:
+    """Construct a prompt that instructs the model to answer using only the provided contexts."""
+    context_block = "\n".join(contexts)
+    memory_block = "\n".join(f"Q: {item['query']}\nA: {item['response']}" for item in recent_memory)
+    return _ANSWER_TEMPLATE.format(contexts=context_block, memory=memory_block, query=query)
+
+
+async def generate_answer(query: str, contexts: list[str], memory: ConversationMemory, api_key: str | None = None) -> str:
     """
     Generate an answer to a user query using retrieved document contexts.
     
@@ -49,38 +116,77 @@ def generate_answer(query: str, contexts: list[str], memory: ConversationMemory,
         ValueError: If OpenAI API key is not configured
         Exception: If OpenAI API call fails
     """
-    client = get_client(api_key)
     recent_memory = memory.get_memory()
 
+    cache_key = _answer_cache_key(query, contexts, recent_memory)
+    cached = await response_cache.aget(cache_key)
+    if cached is not None:
+        return cached
 
-    # Construct a prompt that instructs the model to answer using only the provided contexts
-    prompt = f""""You are an assistant with access to retrieved contexts from various documents.
-    Using the information you find in the documents, answer the user query using only the contexts below.
-    There might be Questions and Answers in the context that you can use to answer the user query.
-    If the user query is a question, you should answer it based on the context.
-    If there are no questions and answers present in the context, you should answer the user query based on the context.
+    client = get_client(api_key)
+    prompt = _build_answer_prompt(query, contexts, recent_memory)
 
+    response = await client.chat.completions.create(
+        model=LLM_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=ANSWER_TEMPERATURE,
+        max_tokens=ANSWER_MAX_TOKENS,
+        seed=LLM_SEED
+    )
+    answer = response.choices[0].message.content.strip() # type: ignore
+    await response_cache.aset(cache_key, answer)
+    return answer
 
-    Context: 
-    {chr(10).join(contexts)}
 
-    Recent Memory:
-    {chr(10).join([f"Q: {item['query']}\nA: {item['response']}" for item in recent_memory])}
+async def stream_answer(query: str, contexts: list[str], memory: ConversationMemory, api_key: str | None = None) -> AsyncIterator[str]:
+    """
+    Generate an answer like generate_answer, yielding text fragments as the model produces them.
+    
+    A cached answer is yielded as a single fragment. The complete answer is cached
+    once the stream finishes.
+    
+    Args:
+        query (str): The user's question or query
+        contexts (list[str]): List of relevant document chunks retrieved from the knowledge base
+        memory (ConversationMemory): Conversation memory for the session
+        api_key (str | None): Optional API key. If not provided, uses environment variable.
+    Yields:
+        str: Successive fragments of the generated answer
+        
+    Raises:
+        ValueError: If OpenAI API key is not configured
+        Exception: If OpenAI API call fails
+    """
+    recent_memory = memory.get_memory()
 
-    Query: {query}
+    cache_key = _answer_cache_key(query, contexts, recent_memory)
+    cached = await response_cache.aget(cache_key)
+    if cached is not None:
+        yield cached
+        return
 
-    Answer: 
-    """
+    client = get_client(api_key)
+    prompt = _build_answer_prompt(query, contexts, recent_memory)
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",  # Using GPT-4o-mini for cost efficiency
+    stream = await client.chat.completions.create(
+        model=LLM_MODEL,
         messages=[{"role": "user", "content": prompt}],
-        temperature=0.2  # Low temperature for more deterministic, factual responses
+        temperature=ANSWER_TEMPERATURE,
+        max_tokens=ANSWER_MAX_TOKENS,
+        seed=LLM_SEED,
+        stream=True
     )
-    return response.choices[0].message.content.strip() # type: ignore
+    parts = []
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            parts.append(delta)
+            yield delta
+
+    await response_cache.aset(cache_key, "".join(parts).strip())
 
 
-def enrich_query(query: str, api_key: str | None = None) -> str:
+async def enrich_query(query: str, api_key: str | None = None) -> str:
     """
     Enrich a user query using an LLM.
     
@@ -91,22 +197,21 @@ def enrich_query(query: str, api_key: str | None = None) -> str:
     Returns:
         str: Enriched query with synonyms and related terms
     """
-    prompt = f"""You are a helpful assistant that enriches user queries for document search.
-    Take the user's query and expand it with:
-    - Synonyms and related terms
-    - Alternative phrasings
-    - Contextual variations
-    - Technical terms that might appear in documents
-    
-    Keep the enrichment focused and relevant to the original query.
-    Don't assume specific contexts unless the query explicitly mentions them.
-    
-    Original query: {query}
-    Enriched query:"""
+    cache_key = ResponseCache.make_key("enrich", _ENRICH_CACHE_SCOPE, query)
+    cached = await response_cache.aget(cache_key)
+    if cached is not None:
+        return cached
+
+    prompt = _ENRICH_TEMPLATE.format(query=query)
     client = get_client(api_key)
-    response = client.chat.completions.create(
-        model="gpt-4o-mini", 
+    response = await client.chat.completions.create(
+        model=LLM_MODEL,
         messages=[{"role": "user", "content": prompt}],
-        temperature=0.3 # Slighlty higher for creativity and less deterministic
+        temperature=ENRICH_TEMPERATURE,
+        max_tokens=ENRICH_MAX_TOKENS,
+        stop=ENRICH_STOP,
+        seed=LLM_SEED
     )
-    return response.choices[0].message.content.strip()
\ No newline at end of file
+    enriched = response.choices[0].message.content.strip() # type: ignore
+    await response_cache.aset(cache_key, enriched)
+    return enriched
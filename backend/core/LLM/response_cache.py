@@ -0,0 +1,178 @@
+"""
+Response cache module for memoizing LLM completions.
+
+This module provides a process-wide LRU cache for LLM responses keyed on a hash
+of everything that goes into the prompt, so repeated queries within a session
+skip the OpenAI round trip entirely. The cache can optionally be backed by a
+SQLite table so entries survive restarts; the table is pruned by age and size.
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from hashlib import blake2b
+from cachetools import LRUCache
+from core.memory.sqlite_store import connect
+
+
+# Persisted entries older than this many seconds are deleted...
+PERSIST_TTL_SECONDS = 30 * 24 * 3600
+
+# ...as are the oldest ones beyond this many rows
+PERSIST_MAX_ROWS = 100_000
+
+# The table is pruned on attach and after every this many writes
+PRUNE_EVERY_WRITES = 1000
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache of LLM responses with optional SQLite persistence.
+
+    Lookups hit the in-memory LRU first and fall back to the SQLite table when
+    one is attached; entries found on disk are promoted back into memory. Async
+    callers use aget/aset, which run the SQLite reads and writes in a worker
+    thread so a disk commit never blocks the event loop.
+    """
+
+    def __init__(self, maxsize: int = 2048):
+        """
+        Initialize an empty in-memory cache.
+
+        Args:
+            maxsize (int, optional): Maximum number of entries kept in memory. Defaults to 2048.
+        """
+        self._entries: LRUCache = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._writes = 0
+
+
+    def attach(self, sqlite_path: str) -> None:
+        """
+        Persist cache entries to a SQLite database.
+
+        Args:
+            sqlite_path (str): Path to the SQLite database file
+        """
+        conn = connect(sqlite_path)
+        conn.execute("CREATE TABLE IF NOT EXISTS llm_cache (key BLOB PRIMARY KEY, value TEXT, created_at REAL)")
+
+        # Add the created_at column to tables created before it existed; their rows count as expired
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(llm_cache)")}
+        if "created_at" not in columns:
+            conn.execute("ALTER TABLE llm_cache ADD COLUMN created_at REAL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache(created_at)")
+        conn.commit()
+        with self._lock:
+            self._conn = conn
+            self._prune()
+
+
+    @staticmethod
+    def make_key(*parts: str) -> bytes:
+        """
+        Hash prompt inputs into a compact cache key.
+
+        Each part is length-prefixed so different splits of the same text
+        never collide.
+
+        Args:
+            *parts (str): Strings that fully determine the LLM response
+
+        Returns:
+            bytes: 16-byte BLAKE2b digest
+        """
+        h = blake2b(digest_size=16)
+        for part in parts:
+            data = part.encode()
+            h.update(len(data).to_bytes(8, "little"))
+            h.update(data)
+        return h.digest()
+
+
+    def get(self, key: bytes) -> str | None:
+        """
+        Look up a cached response.
+
+        Args:
+            key (bytes): Key produced by make_key
+
+        Returns:
+            str | None: The cached response, or None on a miss
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None or self._conn is None:
+                return value
+
+            row = self._conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._entries[key] = row[0]
+            return row[0]
+
+
+    def set(self, key: bytes, value: str) -> None:
+        """
+        Store a response in the cache.
+
+        Args:
+            key (bytes): Key produced by make_key
+            value (str): LLM response text
+        """
+        with self._lock:
+            self._entries[key] = value
+            if self._conn is not None:
+                self._conn.execute("INSERT OR REPLACE INTO llm_cache (key, value, created_at) VALUES (?, ?, ?)", (key, value, time.time()))
+                self._conn.commit()
+                self._writes += 1
+                if self._writes % PRUNE_EVERY_WRITES == 0:
+                    self._prune()
+
+
+    def _prune(self) -> None:
+        """Delete persisted entries past PERSIST_TTL_SECONDS or beyond PERSIST_MAX_ROWS; callers hold the lock."""
+        if self._conn is None:
+            return
+        self._conn.execute("DELETE FROM llm_cache WHERE created_at IS NULL OR created_at < ?", (time.time() - PERSIST_TTL_SECONDS,))
+        self._conn.execute("""
+        DELETE FROM llm_cache WHERE key IN (
+            SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+        )""", (PERSIST_MAX_ROWS,))
+        self._conn.commit()
+
+
+    async def aget(self, key: bytes) -> str | None:
+        """
+        Look up a cached response from async code (see get).
+
+        Memory hits return immediately; only a lookup in the SQLite table runs in a worker thread.
+
+        Args:
+            key (bytes): Key produced by make_key
+
+        Returns:
+            str | None: The cached response, or None on a miss
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None or self._conn is None:
+                return value
+        return await asyncio.to_thread(self.get, key)
+
+
+    async def aset(self, key: bytes, value: str) -> None:
+        """
+        Store a response from async code (see set), writing it to SQLite in a worker thread.
+
+        Args:
+            key (bytes): Key produced by make_key
+            value (str): LLM response text
+        """
+        if self._conn is None:
+            with self._lock:
+                self._entries[key] = value
+            return
+        await asyncio.to_thread(self.set, key, value)
@@ -5,56 +5,188 @@ This module provides functionality to convert text chunks into vector embeddings
 that can be used for semantic search and similarity matching in the RAG system.
 """
 
-from openai import OpenAI
 import numpy as np
-import os
+import asyncio
+import base64
+import openai
+from core.openai_client import get_client
 
 
-def get_client(api_key: str | None = None) -> OpenAI:
+# Mini-batching limits for embedding requests
+EMBED_BATCH_SIZE = 64
+EMBED_MAX_BATCH_CHARS = 200_000  # Roughly 50k tokens, well below the per-request limit
+EMBED_MAX_CONCURRENCY = 16
+
+# Retry policy for rate limits, server errors and dropped connections: 1s, 2s, 4s
+EMBED_MAX_RETRIES = 3
+EMBED_RETRY_BASE_DELAY = 1.0
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+
+def decode_embedding(data: str | list[float]) -> np.ndarray:
+    """
+    Convert an embedding from the API response into a float32 vector.
+    
+    Embeddings are requested base64-encoded, which is the raw little-endian float32
+    buffer, so decoding is a single copy instead of parsing thousands of JSON floats.
+    
+    Args:
+        data (str | list[float]): Base64 string (or a plain float list, if the API ignored the format)
+        
+    Returns:
+        np.ndarray: 1-D float32 embedding vector
+    """
+    if isinstance(data, str):
+        return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+    return np.asarray(data, dtype=np.float32)
+
+
+def make_batches(chunks: list[str], batch_size: int = EMBED_BATCH_SIZE, max_chars: int = EMBED_MAX_BATCH_CHARS) -> list[list[int]]:
+    """
+    Group chunk indices into mini-batches of similar length.
+    
+    Chunks are ordered by length (longest first) so each request carries inputs of
+    comparable size, then cut into batches capped by item count and total characters.
+    
+    Args:
+        chunks (list[str]): Text chunks to be embedded
+        batch_size (int, optional): Maximum number of chunks per batch. Defaults to EMBED_BATCH_SIZE.
+        max_chars (int, optional): Maximum total characters per batch. Defaults to EMBED_MAX_BATCH_CHARS.
+        
+    Returns:
+        list[list[int]]: Batches of indices into the original chunks list
+    """
+    order = sorted(range(len(chunks)), key=lambda i: len(chunks[i]), reverse=True)
+
+    batches = []
+    current: list[int] = []
+    current_chars = 0
+    for i in order:
+        size = len(chunks[i])
+        if current and (len(current) >= batch_size or current_chars + size > max_chars):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(i)
+        current_chars += size
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def race_hedged(make_request, hedge_delay: float | None):
     """
-    Initialize and return an OpenAI client using the provided API key or environment variables.
+    Await a request, sending a duplicate if the first is still pending after hedge_delay.
+    
+    Whichever copy succeeds first wins and the other is cancelled; an error is only
+    raised once every copy has failed.
     
     Args:
-        api_key (str | None): Optional API key. If not provided, uses OPENAI_API_KEY environment variable.
+        make_request: Zero-argument coroutine function issuing the request
+        hedge_delay (float | None): Seconds to wait before hedging, or None to never hedge
+        
+    Returns:
+        The first successful response
+    """
+    first = asyncio.ensure_future(make_request())
+    if hedge_delay is None:
+        return await first
+
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+        if not done:
+            pending.add(asyncio.ensure_future(make_request()))
+
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Both copies can finish together; prefer one that succeeded over one that failed
+            for task in done:
+                if not task.cancelled() and task.exception() is None:
+                    return task.result()
+            if not pending:
+                return done.pop().result()
+    finally:
+        # Also reached when the caller is cancelled while a copy is still in flight
+        for task in pending:
+            task.cancel()
+
+
+async def create_embeddings(client, model: str, inputs: list[str], hedge_delay: float | None = None):
+    """
+    Call the embeddings endpoint, retrying transient failures with exponential backoff.
     
+    Args:
+        client (AsyncOpenAI): OpenAI client
+        model (str): Embedding model name
+        inputs (list[str]): Texts to embed in one request
+        hedge_delay (float | None, optional): Hedge each attempt after this many seconds. Defaults to None.
+        
     Returns:
-        OpenAI: Configured OpenAI client instance
+        CreateEmbeddingResponse: The API response
         
     Raises:
-        ValueError: If no API key is provided and OPENAI_API_KEY environment variable is not set
+        openai.APIError: If the request still fails after EMBED_MAX_RETRIES retries,
+            or fails with a non-retryable error
     """
-    key = api_key or os.getenv("OPENAI_API_KEY")
-    if not key:
-        raise ValueError("API key is required. Provide it as a parameter or set OPENAI_API_KEY environment variable")
-    return OpenAI(api_key=key)
+    # Backoff is handled here, so the SDK's own retries are turned off
+    client = client.with_options(max_retries=0)
+
+    async def request():
+        return await client.embeddings.create(model=model, input=inputs, encoding_format="base64")
 
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        try:
+            return await race_hedged(request, hedge_delay)
+        except RETRYABLE_ERRORS:
+            if attempt == EMBED_MAX_RETRIES:
+                raise
+            await asyncio.sleep(EMBED_RETRY_BASE_DELAY * 2 ** attempt)
 
-def embed_chunks(chunks: list[str], model: str = "text-embedding-3-large", api_key: str | None = None) -> list[np.ndarray]:
+
+async def embed_chunks(chunks: list[str], model: str = "text-embedding-3-large", api_key: str | None = None, hedge_delay: float | None = None) -> np.ndarray:
     """
     Generate vector embeddings for a list of text chunks using OpenAI's embedding model.
     
     This function takes text chunks and converts them into high-dimensional vector
     representations that capture semantic meaning, enabling similarity-based search
-    and retrieval in the RAG system.
+    and retrieval in the RAG system. Large inputs are split into length-sorted
+    mini-batches that are sent concurrently (bounded by EMBED_MAX_CONCURRENCY);
+    rate-limited or failed batches are retried with exponential backoff.
     
     Args:
         chunks (list[str]): List of text chunks to embed
         model (str, optional): OpenAI embedding model to use. Defaults to "text-embedding-3-large".
         api_key (str | None): Optional API key. If not provided, uses environment variable.
+        hedge_delay (float | None, optional): If set, a batch still pending after this many
+            seconds is sent a second time and the faster response is used. Defaults to None.
         
     Returns:
-        list[np.ndarray]: List of numpy arrays representing the embeddings for each chunk
+        np.ndarray: C-contiguous float32 array of shape (len(chunks), dimension), one row
+            per chunk in input order
         
     Raises:
         ValueError: If OpenAI API key is not configured
         Exception: If OpenAI API call fails
     """
+    if not chunks:
+        return np.empty((0, 0), dtype=np.float32)
+
     client = get_client(api_key)
-    response = client.embeddings.create(
-        model=model,
-        input=chunks
-    )
-
-    # Convert OpenAI embedding objects to numpy arrays for easier manipulation
-    embeddings = [np.array(item.embedding) for item in response.data]
-    return embeddings
\ No newline at end of file
+    semaphore = asyncio.Semaphore(EMBED_MAX_CONCURRENCY)
+    out: np.ndarray | None = None
+
+    async def embed_batch(indices: list[int]) -> None:
+        nonlocal out
+        async with semaphore:
+            response = await create_embeddings(client, model, [chunks[i] for i in indices], hedge_delay)
+
+        # Write every embedding straight into its chunk's row of the output
+        for item in response.data:
+            vector = decode_embedding(item.embedding)
+            if out is None:
+                out = np.empty((len(chunks), vector.shape[0]), dtype=np.float32)
+            out[indices[item.index]] = vector
+
+    await asyncio.gather(*(embed_batch(batch) for batch in make_batches(chunks)))
+    return out  # type: ignore
@@ -0,0 +1,122 @@
+"""
+BM25 index module implementing Okapi BM25 over an inverted index.
+
+This module provides an incrementally updatable BM25 index: each term maps to a
+posting list of (document position, term frequency) pairs, so adding documents
+only touches their own terms and a query only scores documents that contain at
+least one query term. Posting lists and document lengths are packed into typed
+int32 arrays rather than Python lists of tuples, which keeps the resident index
+several times smaller.
+"""
+
+import heapq
+import math
+from array import array
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, List, Tuple
+
+
+# Okapi BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+class BM25Index:
+    """
+    Term-at-a-time BM25 scorer over an in-memory inverted index.
+
+    Documents are identified by their position in insertion order. Document
+    frequencies and the average document length are kept up to date on every
+    add, so no rebuild is ever needed.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        """
+        Initialize an empty index.
+
+        Args:
+            k1 (float, optional): Term-frequency saturation. Defaults to BM25_K1.
+            b (float, optional): Document-length normalization. Defaults to BM25_B.
+        """
+        self.k1 = k1
+        self.b = b
+        # term -> (document positions, term frequencies), as parallel int32 arrays
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.doc_len = array("i")
+        self.total_len = 0
+
+
+    def __len__(self) -> int:
+        """Return the number of indexed documents."""
+        return len(self.doc_len)
+
+
+    def add(self, tokenized_docs: List[List[str]]) -> None:
+        """
+        Append documents to the index.
+
+        Args:
+            tokenized_docs (List[List[str]]): Token lists, one per document
+        """
+        for tokens in tokenized_docs:
+            pos = len(self.doc_len)
+            for term, tf in Counter(tokens).items():
+                entry = self.postings.get(term)
+                if entry is None:
+                    entry = self.postings[term] = (array("i"), array("i"))
+                entry[0].append(pos)
+                entry[1].append(tf)
+            self.doc_len.append(len(tokens))
+            self.total_len += len(tokens)
+
+
+    def idf(self, term: str) -> float:
+        """
+        Return the inverse document frequency of a term.
+
+        Uses the non-negative form log(1 + (N - df + 0.5) / (df + 0.5)).
+
+        Args:
+            term (str): Index term
+
+        Returns:
+            float: IDF weight (0.0 for terms not in the index)
+        """
+        entry = self.postings.get(term)
+        if entry is None:
+            return 0.0
+        df = len(entry[0])
+        return math.log(1 + (len(self.doc_len) - df + 0.5) / (df + 0.5))
+
+
+    def top_k(self, query_tokens: List[str], k: int) -> List[Tuple[int, float]]:
+        """
+        Score the documents containing any query term and return the best k.
+
+        Args:
+            query_tokens (List[str]): Preprocessed query tokens
+            k (int): Number of results to return
+
+        Returns:
+            List[Tuple[int, float]]: (document position, BM25 score) pairs, best first;
+                only documents with a positive score are returned
+        """
+        if not self.doc_len:
+            return []
+
+        avgdl = self.total_len / len(self.doc_len) or 1.0
+        k1, b = self.k1, self.b
+        doc_len = self.doc_len
+        scores: Dict[int, float] = {}
+
+        for term, qtf in Counter(query_tokens).items():
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            weight = self.idf(term) * qtf
+            for pos, tf in zip(*entry):
+                norm = k1 * (1 - b + b * doc_len[pos] / avgdl)
+                scores[pos] = scores.get(pos, 0.0) + weight * tf * (k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(k, ((pos, score) for pos, score in scores.items() if score > 0), key=itemgetter(1))
@@ -6,73 +6,447 @@ vector indices for fast similarity search operations in the RAG system.
 """
 
 import faiss
+import logging
+import os
 import numpy as np
 
 
-def build_faiss_index(embeddings: np.ndarray, chunk_ids: np.ndarray) -> faiss.IndexIDMap:
+logger = logging.getLogger(__name__)
+
+# Index tiers by corpus size: exact search for small corpora, an HNSW graph up to
+# HNSW_MAX_VECTORS, and IVF-PQ beyond that. HNSW has no GPU implementation, so indices
+# that run on a GPU stay flat (a brute-force GPU scan) up to HNSW_MAX_VECTORS instead
+FLAT_MAX_VECTORS = 5_000
+HNSW_MAX_VECTORS = 500_000
+
+# HNSW graph degree and build/search beam widths
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Indices smaller than this stay on the CPU even when a GPU is available: below it,
+# copying each query batch over PCIe costs more than the GPU saves on the scan
+GPU_MIN_VECTORS = 50_000
+
+# Default number of IVF cells visited per query
+DEFAULT_NPROBE = 16
+
+# IVF training uses at most this many vectors per list
+IVF_TRAIN_POINTS_PER_LIST = 64
+
+# Learn an OPQ rotation ahead of IVF-PQ so the PQ sub-vectors carry balanced variance
+IVF_USE_OPQ = True
+
+# PQ sub-quantizer counts (bytes per code) GPU IVF-PQ supports up to 64, largest first
+GPU_PQ_SUBQUANTIZERS = (64, 56, 48, 40, 32, 28, 24, 20, 16, 12, 8, 4, 3, 2, 1)
+
+# Rows checked, and the norm tolerance used, when deciding whether embeddings are already unit length
+NORM_CHECK_ROWS = 8
+NORM_TOLERANCE = 1e-3
+
+# Scalar quantizer codes for the flat and HNSW tiers; None stores full float32 vectors.
+# "sq8" stores one byte per dimension (a quarter of float32) scaled to per-dimension
+# ranges learned from the vectors the index is built from, so it suits indices built
+# from a representative batch; later vectors outside those ranges are clipped
+QUANTIZATION_CODECS = {"fp16": "SQfp16", "sq8": "SQ8", None: "Flat"}
+DEFAULT_QUANTIZATION = "fp16"
+
+
+# GPU scratch memory shared by every GPU index in the process, created on first use
+_gpu_resources = None
+
+
+def gpu_available() -> bool:
+    """Return True if this FAISS build can see at least one GPU."""
+    return faiss.get_num_gpus() > 0
+
+
+def get_gpu_resources() -> "faiss.StandardGpuResources":
+    """
+    Return the process-wide FAISS GPU resources object.
+    
+    Returns:
+        faiss.StandardGpuResources: Shared GPU resources (temporary memory, CUDA streams)
+    """
+    global _gpu_resources
+    if _gpu_resources is None:
+        _gpu_resources = faiss.StandardGpuResources()
+    return _gpu_resources
+
+
+def index_to_gpu(index: faiss.Index) -> faiss.Index:
+    """
+    Copy a CPU index to GPU 0.
+    
+    Vectors are stored as float16 on the device. Index types without a GPU
+    implementation (HNSW, scalar quantizers) stay on the CPU.
+    
+    Args:
+        index (faiss.Index): CPU index
+        
+    Returns:
+        faiss.Index: GPU copy of the index, or the index itself
+    """
+    options = faiss.GpuClonerOptions()
+    options.useFloat16 = True
+    try:
+        return faiss.index_cpu_to_gpu(get_gpu_resources(), 0, index, options)
+    except RuntimeError as e:
+        logger.warning("Keeping FAISS index on CPU: %s", e)
+        return index
+
+
+def is_gpu_index(index: faiss.Index) -> bool:
+    """
+    Check whether an index, or the index an ID map wraps, lives on the GPU.
+    
+    Args:
+        index (faiss.Index): Index on either device
+        
+    Returns:
+        bool: True for GPU indices
+    """
+    index = faiss.downcast_index(index)
+    if type(index).__name__.startswith("Gpu"):
+        return True
+    inner = getattr(index, "index", None)
+    return inner is not None and type(faiss.downcast_index(inner)).__name__.startswith("Gpu")
+
+
+def index_to_cpu(index: faiss.Index) -> faiss.Index:
+    """
+    Return a CPU copy of a GPU index (CPU indices are returned unchanged, without a copy).
+    
+    Args:
+        index (faiss.Index): Index on either device
+        
+    Returns:
+        faiss.Index: Index on the CPU
+    """
+    if not gpu_available() or not is_gpu_index(index):
+        return index
+    return faiss.index_gpu_to_cpu(index)
+
+
+def normalize_embeddings(embeddings: np.ndarray, assume_normalized: bool = True) -> None:
+    """
+    L2-normalize embeddings in place for cosine similarity via inner product.
+    
+    OpenAI embeddings are already unit length, so when assume_normalized is set only
+    the norms of the first NORM_CHECK_ROWS rows are checked, and the full pass over
+    the matrix is skipped if they are all within NORM_TOLERANCE of 1.
+    
+    Args:
+        embeddings (np.ndarray): 2D float32 array, modified in place
+        assume_normalized (bool, optional): Trust a sample check instead of always
+            normalizing. Defaults to True.
+    """
+    if needs_normalization(embeddings, assume_normalized):
+        faiss.normalize_L2(embeddings)
+
+
+def needs_normalization(embeddings: np.ndarray, assume_normalized: bool = True) -> bool:
+    """
+    Return True if normalize_embeddings would rescale the embeddings.
+    
+    Args:
+        embeddings (np.ndarray): 2D float32 array
+        assume_normalized (bool, optional): Trust a sample check of NORM_CHECK_ROWS rows
+            instead of always normalizing. Defaults to True.
+        
+    Returns:
+        bool: False if the sampled rows are already unit length (or there are none)
+    """
+    if not assume_normalized:
+        return True
+    sample = embeddings[:NORM_CHECK_ROWS]
+    return bool(len(sample)) and np.abs(np.linalg.norm(sample, axis=1) - 1).max() >= NORM_TOLERANCE
+
+
+def index_tier(n_vectors: int, gpu: bool = False) -> int:
+    """
+    Return the index tier suited to a corpus size.
+    
+    Args:
+        n_vectors (int): Number of vectors in the corpus
+        gpu (bool, optional): The index runs on a GPU once it is large enough, so the
+            HNSW tier is skipped. Defaults to False.
+        
+    Returns:
+        int: 0 for flat, 1 for HNSW, 2 for IVF-PQ
+    """
+    if gpu:
+        return 0 if n_vectors < HNSW_MAX_VECTORS else 2
+    if n_vectors < FLAT_MAX_VECTORS:
+        return 0
+    if n_vectors < HNSW_MAX_VECTORS:
+        return 1
+    return 2
+
+
+def tier_of(index: faiss.Index) -> int:
+    """
+    Return the tier of an existing ID-mapped index (see index_tier).
+    
+    Args:
+        index (faiss.Index): IndexIDMap/IndexIDMap2 wrapping the actual index, on CPU or GPU
+        
+    Returns:
+        int: 0 for flat, 1 for HNSW, 2 for IVF (or any other index type)
+    """
+    base = faiss.downcast_index(index.index) #type: ignore
+    if isinstance(base, (faiss.IndexFlat, faiss.IndexScalarQuantizer)) or type(base).__name__ == "GpuIndexFlat":
+        return 0
+    if isinstance(base, faiss.IndexHNSW):
+        return 1
+    return 2
+
+
+def choose_index_factory(n_vectors: int, dimension: int, quantization: str | None = DEFAULT_QUANTIZATION, gpu: bool = False) -> str:
+    """
+    Return the FAISS factory string for a corpus of the given size.
+    
+    Vectors in the flat and HNSW tiers are stored as float16 by default, which
+    halves index memory and the bandwidth of each scan for a negligible recall loss.
+    
+    Args:
+        n_vectors (int): Number of vectors the index will hold
+        dimension (int): Dimensionality of the embeddings
+        quantization (str | None, optional): Vector storage for the flat and HNSW tiers,
+            "fp16", "sq8" or None for float32. Defaults to DEFAULT_QUANTIZATION.
+        gpu (bool, optional): The index runs on a GPU once it holds GPU_MIN_VECTORS. The
+            flat tier then stays a plain Flat index (which index_to_gpu stores as float16 on
+            the device) up to HNSW_MAX_VECTORS, and IVF-PQ uses a sub-quantizer count from
+            GPU_PQ_SUBQUANTIZERS. Defaults to False.
+        
+    Returns:
+        str: "SQfp16", "HNSW32,SQfp16" (or the "SQ8"/"Flat" equivalents for the other quantizations),
+            or "OPQ<m>,IVF<nlist>,PQ<m>x8" with nlist ~ 4*sqrt(N) and one PQ sub-quantizer
+            per 8 dimensions on the CPU (without the OPQ prefix when IVF_USE_OPQ is off)
+    """
+    if quantization not in QUANTIZATION_CODECS:
+        raise ValueError(f"Unsupported quantization: {quantization}")
+    codec = QUANTIZATION_CODECS[quantization]
+
+    tier = index_tier(n_vectors, gpu)
+    if tier == 0:
+        return "Flat" if gpu else codec
+    if tier == 1:
+        return f"HNSW{HNSW_M},{codec}"
+    nlist = int(4 * np.sqrt(n_vectors))
+    if gpu:
+        m = next(m for m in GPU_PQ_SUBQUANTIZERS if dimension % m == 0)
+    else:
+        m = dimension // 8 if dimension % 8 == 0 else next(m for m in (32, 16, 8, 4, 2, 1) if dimension % m == 0)
+    opq = f"OPQ{m}," if IVF_USE_OPQ else ""
+    return f"{opq}IVF{nlist},PQ{m}x8"
+
+
+def build_index(embeddings: np.ndarray, chunk_ids: np.ndarray, factory: str) -> faiss.IndexIDMap2:
+    """
+    Build an ID-mapped inner-product index from a factory string and fill it.
+    
+    IVF indices (and the OPQ rotation in front of them) are trained on a random
+    sample of the embeddings, 8-bit scalar quantizers on all of them; HNSW graphs
+    are built with HNSW_EF_CONSTRUCTION.
+    
+    Args:
+        embeddings (np.ndarray): L2-normalized float32 embeddings, one per row
+        chunk_ids (np.ndarray): Chunk IDs corresponding to each embedding
+        factory (str): FAISS index factory string
+        
+    Returns:
+        faiss.IndexIDMap2: Populated CPU index
+    """
+    base = faiss.index_factory(embeddings.shape[1], factory, faiss.METRIC_INNER_PRODUCT)
+    hnsw = faiss.downcast_index(base)
+    if isinstance(hnsw, faiss.IndexHNSW):
+        hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        hnsw.hnsw.efSearch = HNSW_EF_SEARCH
+
+    if not base.is_trained:
+        ivf = faiss.try_extract_index_ivf(base)
+        n_train = min(len(embeddings), IVF_TRAIN_POINTS_PER_LIST * ivf.nlist) if ivf is not None else len(embeddings)
+        sample = np.random.default_rng(0).choice(len(embeddings), n_train, replace=False) if n_train < len(embeddings) else slice(None)
+        base.train(np.ascontiguousarray(embeddings[sample])) #type: ignore
+
+    index = faiss.IndexIDMap2(base)
+    index.add_with_ids(embeddings, np.asarray(chunk_ids, dtype=np.int64)) #type: ignore
+    return index
+
+
+def search_params(index: faiss.Index, nprobe: int = DEFAULT_NPROBE, ef_search: int = HNSW_EF_SEARCH) -> faiss.SearchParameters | None:
+    """
+    Return per-query search parameters for an ID-mapped index.
+    
+    Args:
+        index (faiss.Index): IndexIDMap/IndexIDMap2 wrapping the actual index
+        nprobe (int, optional): IVF cells to visit. Defaults to DEFAULT_NPROBE.
+        ef_search (int, optional): HNSW search beam width. Defaults to HNSW_EF_SEARCH.
+        
+    Returns:
+        faiss.SearchParameters | None: IVF or HNSW parameters, or None for exact indices
+    """
+    base = faiss.downcast_index(index.index) #type: ignore
+    if isinstance(base, faiss.IndexPreTransform):
+        # OPQ rotation in front of the IVF index; pass its parameters through
+        inner = faiss.SearchParametersIVF(nprobe=nprobe)
+        params = faiss.SearchParametersPreTransform(index_params=inner)
+        params.referenced_objects = [inner]  # keep the inner parameters alive
+        return params
+    if isinstance(base, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=ef_search)
+    # GPU IVF indices are not IndexIVF subclasses but accept the same parameters
+    if isinstance(base, faiss.IndexIVF) or hasattr(base, "nprobe"):
+        return faiss.SearchParametersIVF(nprobe=nprobe)
+    return None
+
+
+def save_index(index: faiss.Index, path: str) -> None:
+    """
+    Write an index to disk atomically.
+    
+    The index is written to a temporary file next to path and renamed over it,
+    so a crash mid-write never leaves a truncated index behind.
+    
+    Args:
+        index (faiss.Index): Index to save (GPU indices are copied to the CPU first)
+        path (str): Destination file path
+    """
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(index_to_cpu(index), tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_index(path: str, mmap: bool = False) -> faiss.Index:
+    """
+    Read an index from disk.
+    
+    Args:
+        path (str): Index file path
+        mmap (bool, optional): Memory-map the index data instead of reading it into RAM,
+            so large indices load in constant time and pages are faulted in on use.
+            FAISS maps the inverted lists of IVF indices read-only (see is_read_only)
+            and reads other index types normally. Defaults to False.
+        
+    Returns:
+        faiss.Index: CPU index
+    """
+    if mmap:
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            logger.warning("Could not memory-map FAISS index, reading it into memory: %s", e)
+    return faiss.read_index(path)
+
+
+def is_read_only(index: faiss.Index) -> bool:
+    """
+    Return True if the index's inverted lists are memory-mapped from disk.
+    
+    Such an index can be searched but not added to; reload it with
+    load_index(path) before adding vectors.
+    
+    Args:
+        index (faiss.Index): Index, possibly ID-mapped or wrapped in a pre-transform
+        
+    Returns:
+        bool: True for IVF indices loaded with load_index(path, mmap=True)
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    return ivf is not None and isinstance(faiss.downcast_InvertedLists(ivf.invlists), faiss.OnDiskInvertedLists)
+
+
+def build_faiss_index(embeddings: np.ndarray, chunk_ids: np.ndarray, use_gpu: bool = True, assume_normalized: bool = True) -> faiss.Index:
     """
     Build a FAISS vector index from embeddings with associated chunk IDs.
     
-    This function creates a FAISS IndexIDMap that allows for efficient similarity search
+    This function creates a FAISS IndexIDMap2 that allows for efficient similarity search
     while maintaining the ability to map results back to original chunk IDs. The index
-    uses inner product (cosine similarity) for similarity measurement.
+    uses inner product (cosine similarity) for similarity measurement, and its type is
+    chosen from the corpus size (see choose_index_factory). The index is built on
+    the CPU and then copied to GPU 0 when one is available.
     
     Args:
         embeddings (np.ndarray): 2D array of embeddings where each row is a vector
         chunk_ids (np.ndarray): Array of chunk IDs corresponding to each embedding
+        use_gpu (bool, optional): Move the index to a GPU if FAISS reports one. Defaults to True.
+        assume_normalized (bool, optional): Skip normalization when a sample of the
+            embeddings is already unit length. Defaults to True.
         
     Returns:
-        faiss.IndexIDMap: FAISS index ready for similarity search
+        faiss.Index: FAISS index (IndexIDMap2, or its GPU copy) ready for similarity search
         
     Note:
-        The embeddings are L2-normalized before indexing to enable cosine similarity
-        search using inner product.
+        The embeddings are L2-normalized (unless already unit length) before indexing
+        to enable cosine similarity search using inner product.
     """    
-    dimension = embeddings.shape[1]
-    
-    # Create an IndexIDMap with inner product similarity (cosine similarity after L2 normalization)
-    index = faiss.IndexIDMap(faiss.IndexFlatIP(dimension))
-    
-    # Normalize embeddings for cosine similarity
-    faiss.normalize_L2(embeddings)
-    
-    # Add embeddings to index with their corresponding IDs
-    index.add_with_ids(embeddings, np.array(chunk_ids, dtype=np.int64)) # type: ignore
+    # Normalize embeddings for cosine similarity (converting only if not already contiguous float32)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    normalize_embeddings(embeddings, assume_normalized)
 
-    return index
+    gpu = use_gpu and gpu_available()
+    index = build_index(embeddings, chunk_ids, choose_index_factory(*embeddings.shape, gpu=gpu))
+    return index_to_gpu(index) if gpu else index
 
 
-def search_index(index: faiss.IndexFlatIP, query_vector: np.ndarray, k: int = 3) -> tuple[np.ndarray, np.ndarray]:
+def search_index(index: faiss.Index, query_vectors: np.ndarray, k: int = 3, nprobe: int = DEFAULT_NPROBE, ef_search: int = HNSW_EF_SEARCH, assume_normalized: bool = True) -> tuple[np.ndarray, np.ndarray]:
     """
-    Search a FAISS index for the top-k most similar vectors to a query embedding.
+    Search a FAISS index for the top-k most similar vectors to one or more query embeddings.
     
     This function performs similarity search on a FAISS index and returns the
-    most similar vectors along with their similarity scores and IDs.
+    most similar vectors along with their similarity scores and IDs. A 2D input
+    is searched as one batch, so the scan of the index is shared by all queries.
     
     Args:
-        index (faiss.IndexFlatIP): FAISS index to search
-        query_vector (np.ndarray): Query vector to search for
-        k (int, optional): Number of top results to return. Defaults to 3.
+        index (faiss.Index): FAISS index to search
+        query_vectors (np.ndarray): A single query vector, or a 2D array with one query per row
+        k (int, optional): Number of top results to return per query. Defaults to 3.
+        nprobe (int, optional): IVF cells to visit; ignored by other index types. Defaults to DEFAULT_NPROBE.
+        ef_search (int, optional): HNSW search beam width; ignored by other index types.
+            Defaults to HNSW_EF_SEARCH.
+        assume_normalized (bool, optional): Skip normalization when the queries are already
+            unit length. Defaults to True.
         
     Returns:
-        tuple[np.ndarray, np.ndarray]: Tuple containing (distances, ids) where:
+        tuple[np.ndarray, np.ndarray]: Tuple containing (distances, ids), each of shape (n_queries, k), where:
             - distances: Array of similarity scores (higher is more similar)
-            - ids: Array of chunk IDs corresponding to the results
+            - ids: Array of chunk IDs corresponding to the results (-1 if missing)
             
     Note:
-        The query vector is L2-normalized before search to ensure cosine similarity
-        calculation is correct.
+        The query vectors are L2-normalized (unless already unit length) before
+        search to ensure cosine similarity calculation is correct. They are only
+        copied when they are not contiguous float32 or need normalizing; the
+        caller's array is never modified.
     """
-    # Ensure query vector is in the correct format
-    q = np.asarray(query_vector, dtype=np.float32)
-
-    # Reshape to 2D if needed (FAISS expects 2D arrays)
+    # View as a contiguous 2D float32 array (FAISS expects 2D arrays), converting only if needed
+    q = np.ascontiguousarray(query_vectors, dtype=np.float32)
     if q.ndim == 1:
-        q = q[None, :]
+        q = q.reshape(1, -1)
     
-    # Normalize query vector for cosine similarity
-    faiss.normalize_L2(q)
+    # Normalize query vectors for cosine similarity, on a copy if q still shares the caller's memory
+    if needs_normalization(q, assume_normalized):
+        if np.may_share_memory(q, query_vectors):
+            q = q.copy()
+        faiss.normalize_L2(q)
     
     # Perform the search
-    distances, ids = index.search(q, k) # type: ignore
-    return distances, ids
\ No newline at end of file
+    distances, ids = index.search(q, k, params=search_params(index, nprobe, ef_search)) # type: ignore
+    return distances, ids
+
+
+def batch_search(index: faiss.Index, queries: list[np.ndarray], k: int = 3, nprobe: int = DEFAULT_NPROBE, ef_search: int = HNSW_EF_SEARCH) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Search several independent query vectors with a single FAISS call.
+    
+    Args:
+        index (faiss.Index): FAISS index to search
+        queries (list[np.ndarray]): Query vectors, each 1D or of shape (1, D)
+        k (int, optional): Number of top results to return per query. Defaults to 3.
+        nprobe (int, optional): IVF cells to visit. Defaults to DEFAULT_NPROBE.
+        ef_search (int, optional): HNSW search beam width. Defaults to HNSW_EF_SEARCH.
+        
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (distances, ids), row i belonging to queries[i]
+    """
+    return search_index(index, np.vstack(queries), k, nprobe, ef_search)
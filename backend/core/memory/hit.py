@@ -0,0 +1,52 @@
+"""
+Hit module defining the search result type shared by the retrievers.
+
+Semantic (FAISS) and lexical (BM25) search both return lists of Hit objects.
+Hits are slotted dataclasses rather than dicts, so each result is a compact
+fixed-layout object, and orjson serializes them natively in API responses.
+"""
+
+import sqlite3
+from dataclasses import dataclass
+from operator import attrgetter
+from typing import Iterable
+
+
+@dataclass(slots=True)
+class Hit:
+    """
+    A retrieved chunk with its relevance score.
+
+    Attributes:
+        id (int): Chunk ID from the database
+        score (float): Relevance score (higher is more relevant); its scale depends on
+            the retriever, and fusion/reranking overwrite it
+        doc_id (str): Document ID this chunk belongs to
+        content (str): The actual text content of the chunk
+        source_filename (str): Original filename of the source document
+        session_id (str): Session ID this chunk belongs to
+    """
+    id: int
+    score: float
+    doc_id: str
+    content: str
+    source_filename: str
+    session_id: str
+
+
+def hits_from_rows(rows: Iterable[sqlite3.Row], scores: dict[int, float], k: int) -> list[Hit]:
+    """
+    Build the top-k hits from chunk rows and their scores.
+
+    Args:
+        rows (Iterable[sqlite3.Row]): Rows selected with SELECT_SESSION_CHUNKS_SQL
+            (id, doc_id, content, source_filename, session_id)
+        scores (dict[int, float]): Score of each candidate chunk ID
+        k (int): Number of hits to return
+
+    Returns:
+        list[Hit]: Up to k hits, best first
+    """
+    hits = [Hit(row[0], scores[row[0]], row[1], row[2], row[3], row[4]) for row in rows]
+    hits.sort(key=attrgetter("score"), reverse=True)
+    return hits[:k]
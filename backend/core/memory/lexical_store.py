@@ -6,11 +6,25 @@ for exact term matching, complementing the semantic search capabilities
 in the RAG system.
 """
 
-import sqlite3
+import json
 import os
-from typing import List, Dict, Optional
-from rank_bm25 import BM25Okapi
+import re
+import threading
+from typing import List, Optional
+from core.memory.bm25_index import BM25Index
 from utils.preprocessor import preprocess_text, batch_preprocess_texts
+from core.memory.hit import Hit, hits_from_rows
+from core.memory.sqlite_store import connect, thread_connection, SELECT_SESSION_CHUNKS_SQL
+
+
+# FTS5 search within a session; bm25() is lower-is-better, so it is negated
+SEARCH_FTS_SQL = """
+SELECT c.id, c.doc_id, c.content, c.source_filename, c.session_id, -bm25(chunks_fts) AS score
+FROM chunks_fts JOIN chunks c ON c.id = chunks_fts.rowid
+WHERE chunks_fts MATCH ? AND c.session_id = ?
+ORDER BY score DESC
+LIMIT ?
+"""
 
 
 class LexicalStore:
@@ -31,13 +45,15 @@ class LexicalStore:
             sqlite_path (str): Path to the SQLite database file
         """
         self.sqlite_path = sqlite_path
-        self.bm25_index: Optional[BM25Okapi] = None
-        self.corpus: List[List[str]] = []
+        self.bm25_index = BM25Index()
         self.chunk_ids: List[int] = []
+
+        # Guards bm25_index and chunk_ids, which are updated from ingest threads
+        self._index_lock = threading.Lock()
         
-        # Initialize database connection
-        self.conn = sqlite3.connect(sqlite_path)
-        self.conn.row_factory = sqlite3.Row
+        # Initialize the write connection; searches read through per-thread connections
+        self.conn = connect(sqlite_path)
+        self._write_lock = threading.Lock()
         
         # Rebuild BM25 index from existing data
         self._rebuild_from_database()
@@ -49,6 +65,8 @@ class LexicalStore:
         
         This method tokenizes the provided chunks and adds them to the BM25
         index for lexical search operations, associating them with a session_id.
+        The inverted index is updated in place, so the cost is proportional to
+        the new chunks rather than the whole corpus.
         
         Args:
             chunks (List[str]): List of text chunks to add
@@ -58,15 +76,21 @@ class LexicalStore:
         # Tokenize all chunks using the preprocessor
         tokenized_chunks = batch_preprocess_texts(chunks)
         
-        # Add to corpus and chunk_ids
-        self.corpus.extend(tokenized_chunks)
-        self.chunk_ids.extend(chunk_ids)
-        
-        # Rebuild BM25 index with updated corpus
-        self._build_bm25_index()
+        # Persist the tokens so restarts don't re-tokenize the corpus
+        with self._write_lock:
+            self.conn.executemany(
+                "UPDATE chunks SET tokens = ? WHERE id = ?",
+                [(json.dumps(tokens), chunk_id) for tokens, chunk_id in zip(tokenized_chunks, chunk_ids)]
+            )
+            self.conn.commit()
+
+        # Add to BM25 index and chunk_ids
+        with self._index_lock:
+            self.bm25_index.add(tokenized_chunks)
+            self.chunk_ids.extend(chunk_ids)
 
         
-    def search_with_session_id(self, query: str, session_id: str, k: int = 3) -> List[Dict]:
+    def search_with_session_id(self, query: str, session_id: str, k: int = 3) -> List[Hit]:
         """
         Search for the most relevant chunks using BM25 within a specific session.
         
@@ -79,90 +103,94 @@ class LexicalStore:
             k (int, optional): Number of top results to return. Defaults to 3.
             
         Returns:
-            List[Dict]: List of dictionaries containing:
-                - id: Chunk ID from the database
-                - score: BM25 relevance score
-                - doc_id: Document ID this chunk belongs to
-                - content: The actual text content of the chunk
-                - source_filename: Original filename of the source document
-                - session_id: Session ID this chunk belongs to
+            List[Hit]: Up to k hits scored by BM25 relevance, best first
         """
-        if not self.bm25_index:
-            return []
-
         # Preprocess the query
         query_tokens = preprocess_text(query)
         
-        # Get BM25 scores for all documents
-        scores = self.bm25_index.get_scores(query_tokens)
-        
-        # Get top-k results
-        top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k * 2]  # Get 2x more for filtering
-        
-        # Filter out results with zero scores
-        results = []
-        cursor = self.conn.cursor()
-        
-        for idx in top_indices:
-            if scores[idx] > 0:
-                chunk_id = self.chunk_ids[idx]
-                score = scores[idx]
-                
-                # Get metadata from database with session_id filter
-                row = cursor.execute(
-                    "SELECT id, doc_id, content, source_filename, session_id FROM chunks WHERE id = ? AND session_id = ?",
-                    (chunk_id, session_id)
-                ).fetchone()
-                
-                if row:
-                    results.append({
-                        "id": row["id"],
-                        "score": float(score),
-                        "doc_id": row["doc_id"],
-                        "content": row["content"],
-                        "source_filename": row["source_filename"],
-                        "session_id": row["session_id"],
-                    })
-        
-        # Sort by score and return top-k
-        results.sort(key=lambda x: x["score"], reverse=True)
-        return results[:k]
-    
+        # Score only chunks containing a query term; get 2x more for filtering (zero scores are dropped)
+        with self._index_lock:
+            top = self.bm25_index.top_k(query_tokens, k * 2)
+            scores = {self.chunk_ids[pos]: score for pos, score in top}
+        if not scores:
+            return []
+
+        # Get metadata for all candidates in one query with session_id filter
+        rows = thread_connection(self.sqlite_path).execute(SELECT_SESSION_CHUNKS_SQL, (json.dumps(list(scores)), session_id))
+        return hits_from_rows(rows, scores, k)
 
-    def _build_bm25_index(self) -> None:
+
+    def search_fts(self, query: str, session_id: str, k: int = 3) -> List[Hit]:
         """
-        Build or rebuild the BM25 index from the current corpus.
+        Search chunks with SQLite's FTS5 full-text index within a specific session.
+        
+        Unlike search_with_session_id, the query is matched against the raw chunk
+        text (unicode61 tokenization, no lemmatization or stopword removal), and
+        scoring runs entirely inside SQLite.
         
-        This internal method creates a new BM25Okapi index from the tokenized
-        corpus and chunk IDs.
+        Args:
+            query (str): Query string to search for
+            session_id (str): Session ID to filter results by
+            k (int, optional): Number of top results to return. Defaults to 3.
+            
+        Returns:
+            List[Hit]: Up to k hits scored by FTS5 BM25 relevance, best first
         """
-        if self.corpus:
-            self.bm25_index = BM25Okapi(self.corpus)
+        # Match any query word; each is quoted so FTS5 operators in the query are taken literally
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+        match = " OR ".join(f'"{word}"' for word in words)
+
+        rows = thread_connection(self.sqlite_path).execute(SEARCH_FTS_SQL, (match, session_id, k))
+        return [Hit(row[0], row[5], row[1], row[2], row[3], row[4]) for row in rows]
     
 
     def _rebuild_from_database(self) -> None:
         """
         Rebuild the BM25 index from existing chunks in the database.
         
-        This method reads all existing chunks from the SQLite database,
-        tokenizes them, and rebuilds the BM25 index for search operations.
+        This method reads all existing chunks and their stored tokens from the
+        SQLite database and rebuilds the BM25 index for search operations. Chunks
+        stored before tokens were persisted are tokenized once and backfilled.
         """
         cursor = self.conn.cursor()
         rows = cursor.execute(
-            "SELECT id, content FROM chunks ORDER BY id"
+            "SELECT id, tokens FROM chunks ORDER BY id"
         ).fetchall()
         
         if rows:
-            # Extract chunk IDs and contents
+            # Extract chunk IDs and stored tokens
             chunk_ids = [row["id"] for row in rows]
-            contents = [row["content"] for row in rows]
-            
-            # Tokenize all chunks
-            tokenized_chunks = batch_preprocess_texts(contents)
+            tokenized_chunks = [json.loads(row["tokens"]) if row["tokens"] is not None else None for row in rows]
+
+            # Tokenize and backfill legacy rows
+            missing = [i for i, tokens in enumerate(tokenized_chunks) if tokens is None]
+            if missing:
+                self._backfill_tokens(tokenized_chunks, chunk_ids, missing)
             
-            # Update corpus and chunk_ids
-            self.corpus = tokenized_chunks
+            # Build BM25 index and chunk_ids
+            self.bm25_index.add(tokenized_chunks)
             self.chunk_ids = chunk_ids
-            
-            # Build BM25 index
-            self._build_bm25_index()
\ No newline at end of file
+
+
+    def _backfill_tokens(self, tokenized_chunks: List[Optional[List[str]]], chunk_ids: List[int], missing: List[int]) -> None:
+        """
+        Tokenize chunks that have no stored tokens and persist them.
+        
+        Args:
+            tokenized_chunks (List[Optional[List[str]]]): Token lists by position, filled in place
+            chunk_ids (List[int]): Chunk IDs by position
+            missing (List[int]): Positions whose tokens are missing
+        """
+        missing_ids = [chunk_ids[i] for i in missing]
+        contents = dict(self.conn.execute("SELECT id, content FROM chunks WHERE tokens IS NULL").fetchall())
+        tokens = batch_preprocess_texts([contents[chunk_id] for chunk_id in missing_ids])
+
+        for i, chunk_tokens in zip(missing, tokens):
+            tokenized_chunks[i] = chunk_tokens
+        self.conn.executemany(
+            "UPDATE chunks SET tokens = ? WHERE id = ?",
+            [(json.dumps(chunk_tokens), chunk_id) for chunk_tokens, chunk_id in zip(tokens, missing_ids)]
+        )
+        self.conn.commit()
@@ -6,13 +6,35 @@ and SQLite metadata storage, enabling efficient document storage and retrieval
 in the RAG system.
 """
 
+import atexit
 import faiss
-import sqlite3
+import json
+import logging
 import os
+import threading
+import time
 import numpy as np
+from contextlib import nullcontext
 from datetime import datetime
-from core.memory.sqlite_store import init_db
-from core.memory.faiss_store import build_faiss_index
+from core.memory.hit import Hit, hits_from_rows
+from core.memory.sqlite_store import init_db, connect, thread_connection, SELECT_CHUNKS_SQL, SELECT_SESSION_CHUNKS_SQL
+from core.memory.faiss_store import (
+    DEFAULT_NPROBE, DEFAULT_QUANTIZATION, GPU_MIN_VECTORS, build_index, choose_index_factory, gpu_available,
+    index_tier, index_to_gpu, is_gpu_index, is_read_only, load_index, normalize_embeddings, save_index, search_index, tier_of,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# The index is written to disk once this many documents are unsaved...
+SAVE_AFTER_ADDS = 32
+
+# ...or once unsaved changes are this many seconds old
+SAVE_INTERVAL_SECONDS = 30.0
+
+# Searches use one FAISS (OpenMP) thread per this many queries in the batch; a single
+# query runs on one thread, since concurrent requests already occupy other worker threads
+SEARCH_QUERIES_PER_THREAD = 4
 
 
 class MemoryManager:
@@ -24,31 +46,61 @@ class MemoryManager:
     It coordinates between FAISS for vector operations and SQLite for metadata storage.
     """
     
-    def __init__(self, faiss_path: str, sqlite_path: str):
+    def __init__(self, faiss_path: str, sqlite_path: str, index_factory: str | None = None, use_gpu: bool = True, quantization: str | None = DEFAULT_QUANTIZATION, omp_threads: int | None = None):
         """
         Initialize the MemoryManager with paths to FAISS index and SQLite database.
         
         Args:
             faiss_path (str): Path to the FAISS index file
             sqlite_path (str): Path to the SQLite database file
+            index_factory (str | None): Optional FAISS factory string (e.g. "HNSW32") used for
+                new indices. If not provided, the index type follows the corpus size: flat,
+                then HNSW, then IVF-PQ, rebuilt as the corpus crosses each threshold.
+            use_gpu (bool, optional): Run the index on GPU 0 when FAISS reports a GPU and
+                the index holds at least GPU_MIN_VECTORS vectors; size-chosen indices then
+                use the GPU-compatible tiers (see choose_index_factory). Defaults to True;
+                pass False to force CPU search.
+            quantization (str | None, optional): Vector storage for size-chosen flat and HNSW
+                indices, "fp16", "sq8" or None for float32. Defaults to DEFAULT_QUANTIZATION.
+            omp_threads (int | None, optional): Most FAISS threads used by index builds, adds
+                and batched searches. Defaults to the number of CPUs.
         """
         self.faiss_path = faiss_path
         self.sqlite_path = sqlite_path
+        self.index_factory = index_factory
+        self.quantization = quantization
+        self.use_gpu = use_gpu and gpu_available()
+        self.omp_threads = omp_threads or os.cpu_count() or 1
 
-        # Initialize SQLite database and connection
+        # Initialize SQLite database and the write connection; reads use per-thread connections
         init_db(sqlite_path)
-        self.conn = sqlite3.connect(sqlite_path)
-        self.conn.row_factory = sqlite3.Row  # Enable dict-like access to rows
+        self.conn = connect(sqlite_path)
+        self._write_lock = threading.Lock()
+
+        # Serializes changes to the index (adds, rebuilds, reloads); searches don't take it,
+        # so slow work done while it is held, like training a rebuilt index, never stalls them
+        self._update_lock = threading.RLock()
+
+        # Guards self.index against searches: held by searches, by in-place adds and while the
+        # index is swapped for a rebuilt or reloaded one. Always taken after _update_lock
+        self._index_lock = threading.Lock()
 
         # Load existing FAISS index if available
         if os.path.exists(faiss_path):
-            self.index = faiss.read_index(faiss_path)
+            self.index = self._read_index()
         else:
             self.index = None
 
+        # Documents added since the index was last written to disk
+        self._dirty_adds = 0
+        self._last_save = time.monotonic()
+
+        # Don't lose a debounced write if the process exits without a clean shutdown
+        atexit.register(self.flush)
 
 
-    def add_document(self, chunks: list[str], embeddings: np.ndarray, doc_id: str, source_filename: str, session_id: str) -> list[int]:
+
+    def add_document(self, chunks: list[str], embeddings: np.ndarray, doc_id: str, source_filename: str, session_id: str, chunk_offset: int = 0, created_at: str | None = None) -> list[int]:
         """
         Add a document's chunks and embeddings to both SQLite and FAISS storage.
         
@@ -62,118 +114,302 @@ class MemoryManager:
             doc_id (str): Unique identifier for the document
             source_filename (str): Original filename of the source document
             session_id (str): Session identifier for grouping documents
+            chunk_offset (int, optional): Position of chunks[0] within the document, when a
+                document is added in several batches. Defaults to 0.
+            created_at (str | None, optional): ISO timestamp recorded for every chunk, so all
+                batches of a document share one. Defaults to the current time.
 
         Returns:
             list[int]: List of chunk IDs that were created in SQLite
         """
-        cursor = self.conn.cursor()
-        chunks_ids = []
-        
-        # Store each chunk in SQLite and collect the generated IDs
-        for idx, chunk in enumerate(chunks):
-            created_at = datetime.now().isoformat()
-            cursor.execute("""
-            INSERT INTO chunks (doc_id, content, chunk_index, source_filename, created_at, session_id)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """, (doc_id, chunk, idx, source_filename, created_at, session_id))
-            chunks_ids.append(cursor.lastrowid)
+        created_at = created_at or datetime.now().isoformat()
+
+        # Store all chunks with one statement in one write transaction. The write lock is
+        # held from BEGIN IMMEDIATE, so the AUTOINCREMENT IDs assigned are contiguous and
+        # end at last_insert_rowid()
+        with self._write_lock:
+            cursor = self.conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.executemany("""
+                INSERT INTO chunks (doc_id, content, chunk_index, source_filename, created_at, session_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """, [(doc_id, chunk, chunk_offset + idx, source_filename, created_at, session_id) for idx, chunk in enumerate(chunks)])
+                last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+        first_id = last_id - len(chunks) + 1
+        self.add_vectors(embeddings, np.arange(first_id, last_id + 1, dtype=np.int64))
+        return list(range(first_id, last_id + 1))
+
+    def add_vectors(self, embeddings: np.ndarray, ids: np.ndarray) -> None:
+        """
+        Add embeddings for chunks already stored in SQLite to the FAISS index.
+        
+        Args:
+            embeddings (np.ndarray): 2D array of embeddings, one row per chunk
+            ids (np.ndarray): Chunk IDs of the rows, as int64
+        """
+        # Prepare embeddings for FAISS storage (no copy when already contiguous float32)
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        normalize_embeddings(embeddings)
+
+        # Index builds and adds use every allowed thread (the setting is per worker thread)
+        faiss.omp_set_num_threads(self.omp_threads)
+
+        with self._update_lock:
+            if self.index is None:
+                # Create new FAISS index, trained on this first batch if the index type needs it
+                factory = self.index_factory or choose_index_factory(*embeddings.shape, self.quantization, self.use_gpu)
+                self._swap_index(self._build_index(embeddings, ids, factory))
+            else:
+                # A memory-mapped index is read-only; it has no unsaved changes, so read it in full from disk
+                if is_read_only(self.index):
+                    self._swap_index(self._to_device(load_index(self.faiss_path)))
+
+                # Add embeddings to FAISS index with corresponding chunk IDs; FAISS indices
+                # can't be modified while another thread searches them
+                with self._index_lock:
+                    self.index.add_with_ids(embeddings, ids) #type: ignore
+
+                # Move to the GPU once the index is large enough to benefit
+                if self._gpu_sized(self.index.ntotal) and not self._gpu_sized(self.index.ntotal - len(ids)):
+                    self._swap_index(self._to_device(self.index))
+
+            # Move to the next index type once the corpus outgrows the current one
+            if self.index_factory is None and index_tier(self.index.ntotal, self.use_gpu) > tier_of(self.index):
+                self._rebuild_index(choose_index_factory(self.index.ntotal, self.index.d, self.quantization, self.use_gpu))
+
+            # Defer the disk write; save_if_due() persists the index in batches
+            self._dirty_adds += 1
+
+    def _build_index(self, embeddings: np.ndarray, ids: np.ndarray, factory: str) -> faiss.Index:
+        """
+        Build an ID-mapped inner-product index from a factory string, fill it and move it to the device.
+        
+        Args:
+            embeddings (np.ndarray): Normalized float32 embeddings, also used for training
+            ids (np.ndarray): int64 chunk IDs for each embedding
+            factory (str): FAISS index factory string
             
-        self.conn.commit()
+        Returns:
+            faiss.Index: Populated index
+        """
+        return self._to_device(build_index(embeddings, ids, factory))
 
-        # Prepare embeddings for FAISS storage
-        embeddings = embeddings.astype("float32")
-        faiss.normalize_L2(embeddings)
+    def _read_index(self) -> faiss.Index:
+        """
+        Read the index from disk and move it to the device.
+        
+        On the CPU the index is memory-mapped, so a large IVF index loads without reading
+        its inverted lists into RAM; it is read in full on the first add_document.
+        
+        Returns:
+            faiss.Index: Loaded index
+        """
+        return self._to_device(load_index(self.faiss_path, mmap=not self.use_gpu))
 
-        # Create new FAISS index if none exists
-        if self.index is None:
-            d = embeddings.shape[1]
-            self.index = faiss.IndexIDMap(faiss.IndexFlatIP(d))
+    def _gpu_sized(self, n_vectors: int) -> bool:
+        """Return True if an index of this size should be searched on the GPU."""
+        return self.use_gpu and n_vectors >= GPU_MIN_VECTORS
 
-        # Add embeddings to FAISS index with corresponding chunk IDs
-        self.index.add_with_ids(embeddings, np.array(chunks_ids, dtype=np.int64)) #type: ignore
+    def _to_device(self, index: faiss.Index) -> faiss.Index:
+        """
+        Move a CPU index to GPU 0 when GPU search is enabled and the index is large enough.
+        
+        Index types without a GPU implementation stay on the CPU.
+        
+        Args:
+            index (faiss.Index): CPU index
+            
+        Returns:
+            faiss.Index: GPU copy of the index, or the index itself
+        """
+        return index_to_gpu(index) if self._gpu_sized(index.ntotal) else index
 
-        # Persist the updated index to disk
-        self.save_index()
+    def _swap_index(self, index: faiss.Index | None) -> None:
+        """Replace the index searches use; callers hold _update_lock."""
+        with self._index_lock:
+            self.index = index
 
-        return chunks_ids
+    def _read_guard(self):
+        """
+        Return the lock a read-only operation other than search must hold on the current index.
+        
+        CPU indices can be read by several threads at once, so reconstructing or saving
+        one only needs _update_lock to keep adds out. GPU indices share one set of GPU
+        resources, which is not thread-safe, so those reads also exclude searches.
+        """
+        return self._index_lock if self.index is not None and is_gpu_index(self.index) else nullcontext()
 
-    def search_with_session_id(self, query_vector: np.ndarray, session_id: str, k: int = 3) -> list[dict]:
+    def _rebuild_index(self, factory: str) -> None:
         """
-        Search for the most similar chunks to a query vector within a specific session.
+        Rebuild the current index with another index type.
         
-        This method performs similarity search using the FAISS index and retrieves
-        the corresponding metadata from SQLite, filtered by session_id.
+        The stored vectors are reconstructed from the current (flat or HNSW) index and
+        used both to train the new index and to populate it under the same chunk IDs.
+        Searches keep using the current index until the new one is swapped in.
         
         Args:
-            query_vector (np.ndarray): Query vector to search for
-            session_id (str): Session ID to filter results by
-            k (int, optional): Number of top results to return. Defaults to 3.
+            factory (str): FAISS index factory string for the new index
+        """
+        # Adds are held off by _update_lock, so the snapshot stays complete until the swap
+        with self._update_lock:
+            with self._read_guard():
+                current = faiss.downcast_index(self.index.index) #type: ignore
+                vectors = current.reconstruct_n(0, current.ntotal)
+                ids = faiss.vector_to_array(self.index.id_map).astype(np.int64) #type: ignore
+            self._swap_index(self._build_index(vectors, ids, factory))
+        logger.info("FAISS index rebuilt as %s with %d vectors", factory, len(ids))
+
+    def search_vectors(self, query_vectors: np.ndarray, k: int, nprobe: int = DEFAULT_NPROBE) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Run one FAISS search for a batch of query vectors.
+        
+        Args:
+            query_vectors (np.ndarray): 2D array with one query embedding per row
+            k (int): Number of neighbours to return per query
+            nprobe (int, optional): IVF cells to visit per query; ignored by non-IVF indices.
+                Defaults to DEFAULT_NPROBE.
             
         Returns:
-            list[dict]: List of dictionaries containing:
-                - id: Chunk ID from the database
-                - score: Similarity score (higher is more similar)
-                - doc_id: Document ID this chunk belongs to
-                - content: The actual text content of the chunk
-                - source_filename: Original filename of the source document
-                - session_id: Session ID this chunk belongs to
-                    
+            tuple[np.ndarray, np.ndarray]: Similarity scores and chunk IDs, each of shape
+                (n_queries, k); missing neighbours have ID -1
+                
         Raises:
             ValueError: If no index is available and cannot be loaded
         """
         # Ensure index is loaded
         if self.index is None:
-            print("Index not loaded in memory. Attempting to reload..")
+            logger.info("Index not loaded in memory. Attempting to reload..")
             self.load_index()
+
+        with self._index_lock:
             if self.index is None:
                 raise ValueError("Failed to load index. Ensure /upload was called first.")
-        
-        # Prepare query vector for search
-        q = np.asarray(query_vector, dtype=np.float32)
-        if q.ndim == 1:
-            q = q[None, :]
 
-        # Normalize for cosine similarity
-        faiss.normalize_L2(q)
+            # Scale FAISS threads with the batch instead of fanning every query out over all cores
+            n_queries = len(query_vectors) if np.ndim(query_vectors) > 1 else 1
+            faiss.omp_set_num_threads(min(self.omp_threads, max(1, n_queries // SEARCH_QUERIES_PER_THREAD)))
+            return search_index(self.index, query_vectors, k, nprobe)
 
-        # Perform similarity search (get more results to filter)
-        distances, ids = self.index.search(q, k * 3)  # Get 3x more results for filtering
+    def missing_chunks(self) -> list[tuple[int, str]]:
+        """
+        Find chunks stored in SQLite whose vectors are not in the FAISS index.
+        
+        Index saves are deferred, so a crash loses the vectors added since the last
+        save while their SQLite rows are already committed. The chunk IDs in SQLite
+        are compared with the index's ID map, so gaps anywhere are found, not only
+        past the newest vector.
         
+        Returns:
+            list[tuple[int, str]]: (chunk ID, content) of each missing chunk, in ID order
+        """
+        conn = thread_connection(self.sqlite_path)
+        with self._update_lock:
+            chunk_ids = np.fromiter((row[0] for row in conn.execute("SELECT id FROM chunks")), dtype=np.int64)
+            if self.index is None:
+                indexed = np.empty(0, dtype=np.int64)
+            else:
+                indexed = faiss.vector_to_array(self.index.id_map) #type: ignore
+        missing = np.setdiff1d(chunk_ids, indexed)
+        if not len(missing):
+            return []
+        rows = conn.execute("SELECT id, content FROM chunks WHERE id IN (SELECT value FROM json_each(?)) ORDER BY id", (json.dumps(missing.tolist()),))
+        return [(row[0], row[1]) for row in rows]
+
+    def lookup_hits(self, distances: np.ndarray, ids: np.ndarray, session_id: str, k: int) -> list[Hit]:
+        """
+        Attach chunk metadata to one query's FAISS hits, keeping only the given session.
+        
+        Args:
+            distances (np.ndarray): Similarity scores for one query
+            ids (np.ndarray): Chunk IDs for one query (-1 for missing neighbours)
+            session_id (str): Session ID to filter results by
+            k (int): Number of top results to return
+            
+        Returns:
+            list[Hit]: Up to k hits, best first (see search_with_session_id)
+        """
         # Filter out invalid results (-1 indicates no match)
-        id_list = [int(i) for i in ids[0] if i != -1]
-        score_list = [float(s) for i, s in zip(ids[0], distances[0]) if i != -1]
+        scores = {int(i): float(s) for i, s in zip(ids, distances) if i != -1}
 
-        if not id_list:
+        if not scores:
             return []
 
         # Retrieve metadata for the found chunks with session_id filter
-        placeholders = ",".join("?" for _ in id_list)
-        rows = self.conn.execute(f"""
-                           SELECT id, doc_id, content, source_filename, session_id 
-                           FROM chunks 
-                           WHERE id IN ({placeholders}) AND session_id = ?
-                           """, id_list + [session_id]).fetchall()
-
-        # Create a lookup dictionary for efficient metadata retrieval
-        by_id = {row["id"]: row for row in rows}
-        results = []
+        rows = thread_connection(self.sqlite_path).execute(SELECT_SESSION_CHUNKS_SQL, (json.dumps(list(scores)), session_id))
+        return hits_from_rows(rows, scores, k)
+
+    def search_with_session_id(self, query_vector: np.ndarray, session_id: str, k: int = 3, nprobe: int = DEFAULT_NPROBE) -> list[Hit]:
+        """
+        Search for the most similar chunks to a query vector within a specific session.
+        
+        This method performs similarity search using the FAISS index and retrieves
+        the corresponding metadata from SQLite, filtered by session_id.
+        
+        Args:
+            query_vector (np.ndarray): Query vector to search for
+            session_id (str): Session ID to filter results by
+            k (int, optional): Number of top results to return. Defaults to 3.
+            nprobe (int, optional): IVF cells to visit per query; ignored by non-IVF indices.
+                Defaults to DEFAULT_NPROBE.
+            
+        Returns:
+            list[Hit]: Up to k hits scored by inner-product similarity, best first
+                    
+        Raises:
+            ValueError: If no index is available and cannot be loaded
+        """
+        # Perform similarity search (get more results to filter)
+        distances, ids = self.search_vectors(query_vector, k * 3, nprobe)  # Get 3x more results for filtering
+        return self.lookup_hits(distances[0], ids[0], session_id, k)
+
+    def search_batch(self, query_vectors: np.ndarray, session_ids: str | list[str], k: int = 3, nprobe: int = DEFAULT_NPROBE) -> list[list[Hit]]:
+        """
+        Search for the most similar chunks to several query vectors at once.
+        
+        All queries share one FAISS search and one SQLite lookup (over the union
+        of their hits); the results are then split per query and session-filtered.
+        
+        Args:
+            query_vectors (np.ndarray): 2D array with one query embedding per row
+            session_ids (str | list[str]): Session ID to filter all queries by, or one per query
+            k (int, optional): Number of top results to return per query. Defaults to 3.
+            nprobe (int, optional): IVF cells to visit per query; ignored by non-IVF indices.
+                Defaults to DEFAULT_NPROBE.
+            
+        Returns:
+            list[list[Hit]]: For each query, up to k hits, best first
+                    
+        Raises:
+            ValueError: If no index is available and cannot be loaded, or the number of
+                session IDs does not match the number of queries
+        """
+        distances, ids = self.search_vectors(query_vectors, k * 3, nprobe)  # Get 3x more results for filtering
+        if isinstance(session_ids, str):
+            session_ids = [session_ids] * len(ids)
+        if len(session_ids) != len(ids):
+            raise ValueError(f"Got {len(session_ids)} session IDs for {len(ids)} queries")
 
-        # Combine similarity scores with metadata
-        for cid, score in zip(id_list, score_list):
-            row = by_id.get(cid)
-            if row:
-                results.append({
-                    "id": cid,
-                    "score": score,
-                    "doc_id": row["doc_id"],
-                    "content": row["content"],
-                    "source_filename": row["source_filename"],
-                    "session_id": row["session_id"],
-                })
-        
-        # Sort by score and return top-k
-        results.sort(key=lambda x: x["score"], reverse=True)
-        return results[:k]
+        # Filter out invalid results (-1 indicates no match)
+        row_scores = [{int(i): float(s) for i, s in zip(row_ids, row_dists) if i != -1} for row_ids, row_dists in zip(ids, distances)]
+        all_ids = set().union(*row_scores)
+        if not all_ids:
+            return [[] for _ in row_scores]
+
+        # Retrieve metadata for every hit of every query at once
+        rows = thread_connection(self.sqlite_path).execute(SELECT_CHUNKS_SQL, (json.dumps(list(all_ids)),))
+        by_id = {row[0]: row for row in rows}
+
+        results = []
+        for scores, session_id in zip(row_scores, session_ids):
+            session_rows = [by_id[i] for i in scores if i in by_id and by_id[i][4] == session_id]
+            results.append(hits_from_rows(session_rows, scores, k))
+        return results
                     
     def save_index(self) -> None:
         """
@@ -181,9 +417,36 @@ class MemoryManager:
         
         This method persists the in-memory FAISS index to the specified file path,
         allowing the index to be loaded later without rebuilding from scratch.
+        Writing only reads the index, so searches keep running while it is saved.
         """
-        if self.index is not None:
-            faiss.write_index(self.index, self.faiss_path)
+        with self._update_lock, self._read_guard():
+            # A memory-mapped index is unchanged since it was read from faiss_path
+            if self.index is not None and not is_read_only(self.index):
+                save_index(self.index, self.faiss_path)
+            self._dirty_adds = 0
+            self._last_save = time.monotonic()
+
+    def save_if_due(self) -> bool:
+        """
+        Save the index if enough documents were added or unsaved changes are old enough.
+        
+        Writing the index rewrites the whole file, so saves are batched to one per
+        SAVE_AFTER_ADDS documents or SAVE_INTERVAL_SECONDS, whichever comes first.
+        
+        Returns:
+            bool: True if the index was written to disk
+        """
+        if not self._dirty_adds:
+            return False
+        if self._dirty_adds < SAVE_AFTER_ADDS and time.monotonic() - self._last_save < SAVE_INTERVAL_SECONDS:
+            return False
+        self.save_index()
+        return True
+
+    def flush(self) -> None:
+        """Save the index if it has changes that haven't been written to disk."""
+        if self._dirty_adds:
+            self.save_index()
 
     def load_index(self) -> None:
         """
@@ -193,15 +456,16 @@ class MemoryManager:
         specified file path. If loading fails or no index exists, it initializes
         a new empty index.
         """
-        if os.path.exists(self.faiss_path):
-            try:
-                self.index = faiss.read_index(self.faiss_path)
-                print("FAISS index successfully loaded from disk.")
-            except Exception as e:
-                print(f"Failed to load FAISS index: {e}. Reinitializing new index.")
-                self.index = None
-        else:
-            print("No FAISS index found, creating new.")
-            self.index = None
+        with self._update_lock:
+            if os.path.exists(self.faiss_path):
+                try:
+                    self._swap_index(self._read_index())
+                    logger.info("FAISS index successfully loaded from disk.")
+                except Exception as e:
+                    logger.error("Failed to load FAISS index: %s. Reinitializing new index.", e)
+                    self._swap_index(None)
+            else:
+                logger.info("No FAISS index found, creating new.")
+                self._swap_index(None)
 
     
\ No newline at end of file
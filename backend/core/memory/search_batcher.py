@@ -0,0 +1,142 @@
+"""
+Search batcher module for coalescing concurrent FAISS queries.
+
+This module provides a micro-batching queue in front of the memory manager:
+concurrent /query handlers submit single query vectors, and a background task
+drains the queue and runs them as one stacked FAISS search, so the per-call
+overhead is paid once per batch instead of once per request.
+"""
+
+import asyncio
+import numpy as np
+from typing import Callable
+from core.memory.hit import Hit
+from core.memory.memory_manager import MemoryManager, DEFAULT_NPROBE
+
+
+# Largest number of queries stacked into one FAISS search
+SEARCH_BATCH_SIZE = 32
+
+# Longest time (seconds) the first query in a batch waits for others to join
+SEARCH_BATCH_WAIT = 0.005
+
+
+class SearchBatcher:
+    """
+    Batches concurrent semantic searches into single FAISS calls.
+
+    Each submitted query waits at most SEARCH_BATCH_WAIT for other queries to
+    arrive. Queries in a batch that share an nprobe are stacked into one search
+    using the largest requested k; each caller's session filtering and metadata
+    lookup then run on its own row of the results.
+    """
+
+    def __init__(self, get_memory: Callable[[], MemoryManager], batch_size: int = SEARCH_BATCH_SIZE, max_wait: float = SEARCH_BATCH_WAIT):
+        """
+        Initialize an idle batcher; call start() from a running event loop.
+
+        Args:
+            get_memory (Callable[[], MemoryManager]): Returns the memory manager to search
+            batch_size (int, optional): Maximum queries per FAISS call. Defaults to SEARCH_BATCH_SIZE.
+            max_wait (float, optional): Maximum seconds to wait for a batch to fill. Defaults to SEARCH_BATCH_WAIT.
+        """
+        self.get_memory = get_memory
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+
+
+    def start(self) -> None:
+        """Start the background task that drains the queue."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+
+    async def stop(self) -> None:
+        """Cancel the background task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+    async def search_with_session_id(self, query_vector: np.ndarray, session_id: str, k: int = 3, nprobe: int = DEFAULT_NPROBE) -> list[Hit]:
+        """
+        Search for the most similar chunks to a query vector within a specific session.
+
+        Same contract as MemoryManager.search_with_session_id, but the FAISS search
+        is shared with whichever other queries arrive in the same batch window.
+
+        Args:
+            query_vector (np.ndarray): Query vector to search for
+            session_id (str): Session ID to filter results by
+            k (int, optional): Number of top results to return. Defaults to 3.
+            nprobe (int, optional): IVF cells to visit per query. Defaults to DEFAULT_NPROBE.
+
+        Returns:
+            list[Hit]: Up to k hits, best first
+
+        Raises:
+            ValueError: If no index is available and cannot be loaded
+        """
+        if self._task is None:
+            # Not running under the app lifespan; search directly
+            return await asyncio.to_thread(self.get_memory().search_with_session_id, query_vector, session_id, k, nprobe)
+
+        future = asyncio.get_running_loop().create_future()
+        fetch_k = k * 3  # Over-fetch to leave room for session filtering
+        await self._queue.put((np.asarray(query_vector, dtype=np.float32).reshape(-1), fetch_k, nprobe, future))
+        distances, ids = await future
+        return await asyncio.to_thread(self.get_memory().lookup_hits, distances, ids, session_id, k)
+
+
+    async def _run(self) -> None:
+        """Collect queued queries into batches and search each batch."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Queries with different nprobe values need separate search parameters
+            groups: dict[int, list] = {}
+            for item in batch:
+                groups.setdefault(item[2], []).append(item)
+
+            for nprobe, items in groups.items():
+                await self._search_group(items, nprobe)
+
+
+    async def _search_group(self, items: list, nprobe: int) -> None:
+        """
+        Run one FAISS search for queued queries sharing an nprobe and resolve their futures.
+
+        Args:
+            items (list): Queued (query_vector, fetch_k, nprobe, future) tuples
+            nprobe (int): IVF cells to visit per query
+        """
+        queries = np.vstack([item[0] for item in items])
+        fetch_k = max(item[1] for item in items)
+        try:
+            distances, ids = await asyncio.to_thread(self.get_memory().search_vectors, queries, fetch_k, nprobe)
+        except Exception as e:
+            for item in items:
+                if not item[3].done():
+                    item[3].set_exception(e)
+            return
+
+        # Results are ordered best-first, so each row's prefix is that query's own top fetch_k
+        for row, (_, k, _, future) in enumerate(items):
+            if not future.done():
+                future.set_result((distances[row, :k], ids[row, :k]))
@@ -6,24 +6,102 @@ chunks in a SQLite database, including content, source information, and timestam
 """
 
 import sqlite3
+import threading
 from datetime import datetime
 
 
+# Per-connection settings: WAL lets readers run alongside the writer, NORMAL sync skips
+# the fsync on every commit, the mmap/page cache keep hot pages in memory, and
+# temporary tables and sort buffers stay in RAM.
+CONNECTION_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA mmap_size=268435456;
+PRAGMA cache_size=-65536;
+PRAGMA temp_store=MEMORY;
+"""
+
+
+# Metadata lookup for search hits. The IDs are bound as one JSON array, so the statement
+# text is the same for every hit count and stays in sqlite3's per-connection statement cache
+SELECT_SESSION_CHUNKS_SQL = """
+SELECT id, doc_id, content, source_filename, session_id
+FROM chunks
+WHERE id IN (SELECT value FROM json_each(?)) AND session_id = ?
+"""
+
+# The same lookup without the session filter, for hits of queries from several sessions
+SELECT_CHUNKS_SQL = """
+SELECT id, doc_id, content, source_filename, session_id
+FROM chunks
+WHERE id IN (SELECT value FROM json_each(?))
+"""
+
+
+# Per-thread connections returned by thread_connection, keyed by database path
+_thread_conns = threading.local()
+
+
+# Full-text index over chunk content. It is an external-content FTS5 table (the text is
+# stored once, in chunks) kept in sync by triggers; updates to other columns, such as the
+# BM25 tokens, don't touch it
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(content, content='chunks', content_rowid='id');
+
+CREATE TRIGGER IF NOT EXISTS chunks_fts_insert AFTER INSERT ON chunks BEGIN
+    INSERT INTO chunks_fts(rowid, content) VALUES (new.id, new.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS chunks_fts_delete AFTER DELETE ON chunks BEGIN
+    INSERT INTO chunks_fts(chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS chunks_fts_update AFTER UPDATE OF content ON chunks BEGIN
+    INSERT INTO chunks_fts(chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    INSERT INTO chunks_fts(rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Open a long-lived SQLite connection tuned for the RAG workload.
+    
+    The connection can be used from worker threads (searches run via
+    asyncio.to_thread) and returns rows that support access by column name.
+    
+    Args:
+        path (str): Path to the SQLite database file
+        
+    Returns:
+        sqlite3.Connection: Configured connection
+    """
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(CONNECTION_PRAGMAS)
+    return conn
+
+
 def init_db(path: str) -> None:
     """
     Initialize the SQLite database with the chunks table if it doesn't exist.
     
     This function creates the necessary database schema for storing document chunks
     metadata. The table includes fields for chunk content, document ID, source filename,
-    and creation timestamp.
+    creation timestamp, and the chunk's BM25 tokens (JSON). Databases created before the
+    tokens column existed are migrated in place. Chunks are indexed by doc_id and mirrored
+    into the chunks_fts full-text table; existing chunks are indexed when that table is
+    first created.
     
     Args:
         path (str): Path to the SQLite database file
         
     Note:
         This function is safe to call multiple times as it uses CREATE TABLE IF NOT EXISTS.
+        WAL mode is recorded in the database file, so switching it on here also
+        applies to connections that don't go through connect().
     """
-    conn = sqlite3.connect(path)
+    conn = connect(path)
 
     cursor = conn.cursor()
     cursor.execute("""
@@ -34,13 +112,52 @@ def init_db(path: str) -> None:
                    chunk_index INTEGER,
                    source_filename TEXT,
                    created_at TEXT,
-                   session_id TEXT
+                   session_id TEXT,
+                   tokens TEXT
                    )""")
+
+    # Add the tokens column to databases created before it existed
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(chunks)")}
+    if "tokens" not in columns:
+        cursor.execute("ALTER TABLE chunks ADD COLUMN tokens TEXT")
+
+    # Per-document lookups (deletion, dedup) would otherwise scan the whole table
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc_id ON chunks(doc_id)")
+    conn.commit()
+
+    has_fts = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'").fetchone() is not None
+    conn.executescript(FTS_SCHEMA)
+    if not has_fts:
+        # Index chunks stored before the full-text table existed
+        conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
     conn.commit()
     conn.close()
 
 
-def insert_chunk(doc_id: str, content: str, chunk_index: int, source_filename: str, created_at: str, path: str) -> None:
+def thread_connection(path: str) -> sqlite3.Connection:
+    """
+    Return this thread's connection to the database at path, opening it on first use.
+    
+    In WAL mode readers don't block each other or the writer, so searches running
+    in different worker threads each read through their own connection instead of
+    serializing on a shared one.
+    
+    Args:
+        path (str): Path to the SQLite database file
+        
+    Returns:
+        sqlite3.Connection: Connection opened with connect(), reused by later calls from this thread
+    """
+    conns = getattr(_thread_conns, "by_path", None)
+    if conns is None:
+        conns = _thread_conns.by_path = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = connect(path)
+    return conn
+
+
+def insert_chunk(doc_id: str, content: str, chunk_index: int, source_filename: str, created_at: str, path: str, conn: sqlite3.Connection | None = None) -> None:
     """
     Insert a single chunk record into the SQLite database.
     
@@ -54,20 +171,19 @@ def insert_chunk(doc_id: str, content: str, chunk_index: int, source_filename: s
         source_filename (str): Name of the source file this chunk came from
         created_at (str): ISO format timestamp of when the chunk was created
         path (str): Path to the SQLite database file
+        conn (sqlite3.Connection | None, optional): Open connection to use. Defaults to a
+            connection to path that is kept open and reused by later calls from the same thread.
         
     Note:
         The created_at parameter is overridden with the current timestamp.
-        This function opens and closes its own database connection.
     """
     # Override with current timestamp for consistency
     created_at = datetime.now().isoformat()
 
-    db = sqlite3.connect(path)
+    db = conn or thread_connection(path)
 
-    cursor = db.cursor()
-    cursor.execute("""
-                   INSERT INTO chunks (doc_id, content, chunk_index, source_filename, created_at)
-                   VALUES (?, ?, ?, ?, ?)""", (doc_id, content, chunk_index, source_filename, created_at) )
+    db.execute("""
+               INSERT INTO chunks (doc_id, content, chunk_index, source_filename, created_at)
+               VALUES (?, ?, ?, ?, ?)""", (doc_id, content, chunk_index, source_filename, created_at) )
     
-    db.commit()
-    db.close()
\ No newline at end of file
+    db.commit()
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+OpenAI client module shared by the embedding and LLM modules.
+
+This module provides a client factory backed by a single HTTP connection pool,
+so every OpenAI call in the process reuses the same connections instead of
+building its own.
+"""
+
+from openai import AsyncOpenAI
+import httpx
+import os
+
+
+# Connection pool shared by every client, created on first use
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the process-wide HTTP client, creating it on first use.
+    
+    Returns:
+        httpx.AsyncClient: HTTP/2 client whose connection pool and TLS sessions are shared by all API keys
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client and its pooled connections; called on shutdown."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def get_client(api_key: str | None = None) -> AsyncOpenAI:
+    """
+    Initialize and return an OpenAI client using the provided API key or environment variables.
+    
+    Clients are cheap wrappers around the shared HTTP client, so one is built per
+    call: connections are reused across requests and API keys, and no key is
+    kept in memory after the request that supplied it.
+    
+    Args:
+        api_key (str | None): Optional API key. If not provided, uses OPENAI_API_KEY environment variable.
+    
+    Returns:
+        AsyncOpenAI: Configured async OpenAI client instance
+        
+    Raises:
+        ValueError: If no API key is provided and OPENAI_API_KEY environment variable is not set
+    """
+    key = api_key or os.getenv("OPENAI_API_KEY")
+    if not key:
+        raise ValueError("API key is required. Provide it as a parameter or set OPENAI_API_KEY environment variable")
+    return AsyncOpenAI(api_key=key, http_client=get_http_client())
@@ -0,0 +1,74 @@
+"""
+Reranker module for rescoring retrieved chunks with a cross-encoder.
+
+This module provides an optional second-stage ranking pass: a cross-encoder reads
+each (query, chunk) pair jointly and produces a relevance score that is more
+accurate than the first-stage semantic/lexical fusion, at the cost of local inference.
+"""
+
+import numpy as np
+from functools import lru_cache
+from core.memory.hit import Hit
+
+
+RERANK_MODEL = "BAAI/bge-reranker-v2-m3"
+
+# Number of fused candidates handed to the cross-encoder for a final top-k
+RERANK_MIN_CANDIDATES = 50
+
+
+@lru_cache(maxsize=1)
+def get_reranker():
+    """
+    Load the cross-encoder model once per process.
+
+    sentence-transformers (and torch) are imported here rather than at module
+    level so deployments that never rerank don't pay for loading them.
+
+    Returns:
+        CrossEncoder: Loaded cross-encoder model
+    """
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(RERANK_MODEL)
+
+
+def rerank_candidates(k: int) -> int:
+    """
+    Return how many first-stage candidates to retrieve when reranking to k results.
+
+    Args:
+        k (int): Number of results wanted after reranking
+
+    Returns:
+        int: Candidate pool size
+    """
+    return max(RERANK_MIN_CANDIDATES, 10 * k)
+
+
+def rerank_results(query: str, results: list[Hit], k: int) -> list[Hit]:
+    """
+    Rerank retrieved chunks with the cross-encoder and keep the top-k.
+
+    All (query, chunk) pairs are scored in a single batched predict call.
+
+    Args:
+        query (str): The user's question or query
+        results (list[Hit]): Candidate chunks
+        k (int): Number of results to return
+
+    Returns:
+        list[Hit]: Top-k chunks ordered by cross-encoder score, with score replaced
+            by the cross-encoder relevance (0-1)
+    """
+    if not results:
+        return []
+
+    model = get_reranker()
+    scores = model.predict([(query, r.content) for r in results], batch_size=len(results))
+
+    reranked = []
+    for i in np.argsort(-scores, kind="stable")[:k]:
+        result = results[i]
+        result.score = float(scores[i])
+        reranked.append(result)
+    return reranked
@@ -0,0 +1,94 @@
+"""
+Round-trip tests for chunk storage: SQLite rows, the FTS5 mirror and the FAISS index.
+
+Each test writes through the storage layer, reopens it from disk the way the app
+does on startup, and checks that searches return the same results.
+"""
+
+import numpy as np
+import pytest
+
+from core.memory import faiss_store
+from core.memory.memory_manager import MemoryManager
+from core.memory.sqlite_store import connect, init_db, insert_chunk
+
+DIM = 32
+
+
+def random_embeddings(n: int, seed: int) -> np.ndarray:
+    """Unit-length float32 embeddings, as the OpenAI embedding endpoint returns them."""
+    vectors = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "index.faiss"), str(tmp_path / "chunks.db")
+
+
+def test_search_results_survive_save_and_reload(paths):
+    memory = MemoryManager(*paths, use_gpu=False)
+    embeddings = random_embeddings(20, seed=0)
+    ids = memory.add_document([f"chunk {i}" for i in range(20)], embeddings, "a.txt", "a.txt", "s1")
+    assert ids == list(range(1, 21))
+
+    queries = embeddings[[3, 11]]
+    distances, found = memory.search_vectors(queries, k=5)
+    assert found[:, 0].tolist() == [4, 12]
+
+    memory.save_index()
+    reloaded = MemoryManager(*paths, use_gpu=False)
+    reloaded_distances, reloaded_found = reloaded.search_vectors(queries, k=5)
+    np.testing.assert_array_equal(reloaded_found, found)
+    np.testing.assert_allclose(reloaded_distances, distances, rtol=1e-5)
+
+    hits = reloaded.search_with_session_id(queries[0], "s1", k=1)
+    assert [(hit.id, hit.content, hit.doc_id) for hit in hits] == [(4, "chunk 3", "a.txt")]
+    assert reloaded.search_with_session_id(queries[0], "other", k=1) == []
+    assert reloaded.missing_chunks() == []
+
+
+def test_unsaved_vectors_are_reported_missing_after_reload(paths):
+    memory = MemoryManager(*paths, use_gpu=False)
+    memory.add_document(["saved"] * 5, random_embeddings(5, seed=1), "a.txt", "a.txt", "s1")
+    memory.save_index()
+    memory.add_document(["lost"] * 3, random_embeddings(3, seed=2), "b.txt", "b.txt", "s1")
+
+    reloaded = MemoryManager(*paths, use_gpu=False)
+    missing = reloaded.missing_chunks()
+    assert [(chunk_id, content) for chunk_id, content in missing] == [(6, "lost"), (7, "lost"), (8, "lost")]
+
+    # Re-adding the vectors under their existing IDs closes the gap
+    reloaded.add_vectors(random_embeddings(3, seed=2), np.array([6, 7, 8], dtype=np.int64))
+    assert reloaded.missing_chunks() == []
+
+
+def test_tier_rebuild_keeps_chunk_ids(paths, monkeypatch):
+    monkeypatch.setattr(faiss_store, "FLAT_MAX_VECTORS", 50)
+    memory = MemoryManager(*paths, use_gpu=False)
+    embeddings = random_embeddings(60, seed=3)
+    memory.add_document(["x"] * 40, embeddings[:40], "a.txt", "a.txt", "s1")
+    assert faiss_store.tier_of(memory.index) == 0
+
+    memory.add_document(["y"] * 20, embeddings[40:], "b.txt", "b.txt", "s1")
+    assert faiss_store.tier_of(memory.index) == 1
+
+    memory.save_index()
+    reloaded = MemoryManager(*paths, use_gpu=False)
+    assert faiss_store.tier_of(reloaded.index) == 1
+    _, found = reloaded.search_vectors(embeddings[[0, 45, 59]], k=1)
+    assert found[:, 0].tolist() == [1, 46, 60]
+
+
+def test_inserted_chunks_are_mirrored_into_fts(paths):
+    _, sqlite_path = paths
+    init_db(sqlite_path)
+    insert_chunk("a.txt", "the quick brown fox", 0, "a.txt", "", sqlite_path)
+    insert_chunk("a.txt", "a lazy dog sleeps", 1, "a.txt", "", sqlite_path)
+
+    # Reopening runs init_db again, which must neither drop nor duplicate FTS rows
+    init_db(sqlite_path)
+    conn = connect(sqlite_path)
+    rows = conn.execute("SELECT rowid FROM chunks_fts WHERE chunks_fts MATCH ?", ('"fox"',)).fetchall()
+    assert [row[0] for row in rows] == [1]
+    assert conn.execute("SELECT count(*) FROM chunks_fts WHERE chunks_fts MATCH ?", ('"dog" OR "fox"',)).fetchone()[0] == 2
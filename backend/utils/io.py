@@ -5,11 +5,26 @@ This module provides functionality for saving uploaded files and extracting
 text content from various document formats including TXT, PDF, and DOCX files.
 """
 
+import multiprocessing
 import os
+import shutil
+import threading
 import uuid
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from pypdf import PdfReader
-import docx
+
+
+# File extensions read_text_from_path can extract text from
+SUPPORTED_EXTENSIONS = {".txt", ".pdf", ".docx"}
+
+# Uploads are copied to disk in blocks of this many bytes
+UPLOAD_COPY_BUFFER = 1024 * 1024
+
+# PDFium is not thread-safe, so PDF extraction in one process runs one document at a time
+_pdfium_lock = threading.Lock()
+
+# Worker processes for text extraction, started on first use
+_pool: ProcessPoolExecutor | None = None
 
 
 def save_upload(file_obj, dest_dir: str) -> str:
@@ -28,6 +43,9 @@ def save_upload(file_obj, dest_dir: str) -> str:
         
     Note:
         The original filename extension is preserved for proper file type detection.
+        The upload is streamed to disk in UPLOAD_COPY_BUFFER blocks, so memory use
+        does not grow with file size; this blocks, so call it from a worker thread
+        in async handlers.
     """
     # Extract file extension and generate unique filename
     ext = Path(file_obj.filename).suffix.lower()
@@ -35,13 +53,23 @@ def save_upload(file_obj, dest_dir: str) -> str:
     fullpath = Path(dest_dir) / fid
     fpath = str(fullpath)
     
-    # Write file content to disk
+    # Stream file content to disk
     with open(fpath, "wb") as f:
-        f.write(file_obj.file.read())
+        shutil.copyfileobj(file_obj.file, f, UPLOAD_COPY_BUFFER)
     
     return fpath
 
 
+def _page_text(page) -> str:
+    """Extract a PDF page's text and release its native handles."""
+    textpage = page.get_textpage()
+    try:
+        return textpage.get_text_range()
+    finally:
+        textpage.close()
+        page.close()
+
+
 def read_text_from_path(path: str) -> str:
     """
     Extract text content from a file based on its extension.
@@ -73,27 +101,60 @@ def read_text_from_path(path: str) -> str:
         with open(path, "r", encoding="UTF-8", errors="ignore") as f:
             return f.read()
 
-    # Extract text from PDF files
+    # Extract text from PDF files with the native PDFium parser, skipping pages without a text layer.
+    # Parsers are imported on first use, so processes that only see other formats never load them
     elif ext == ".pdf":
-        chunks = []
-        reader = PdfReader(path)
+        import pypdfium2 as pdfium
+        with _pdfium_lock:
+            pdf = pdfium.PdfDocument(path)
+            try:
+                return "\n".join(filter(None, (_page_text(page) for page in pdf))).strip()
+            finally:
+                pdf.close()
 
-        # Extract text from each page
-        for page in reader.pages:
-            t = page.extract_text() or ""
-            chunks.append(t)
-        return "\n".join(chunks).strip()
-
-    # Extract text from Word documents
+    # Extract text from Word documents, skipping empty paragraphs
     elif ext == ".docx":
-        chunks = []
+        import docx
         doc = docx.Document(path)
-
-        # Extract text from each paragraph
-        for p in doc.paragraphs:
-            t = p.text or ""
-            chunks.append(t)
-        return "\n".join(chunks).strip()
+        return "\n".join(p.text for p in doc.paragraphs if p.text).strip()
  
     else:
-        raise ValueError("Unsupported file type")
\ No newline at end of file
+        raise ValueError("Unsupported file type")
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    Return the process pool used to extract text from several files at once.
+    
+    Workers are spawned rather than forked (the server process runs threads).
+    The pool is separate from the tokenizer pool in utils.preprocessor, so
+    extraction workers never load the spaCy model.
+    
+    Returns:
+        ProcessPoolExecutor: Pool with one worker per CPU
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def read_many(paths: list[str]) -> list[str]:
+    """
+    Extract text from several files in parallel worker processes.
+    
+    PDF and DOCX parsing is CPU-bound and holds the GIL, so each file is parsed
+    in its own process. A single file is read in the calling process.
+    
+    Args:
+        paths (list[str]): Paths of the files to extract text from
+        
+    Returns:
+        list[str]: Extracted text of each file, in the order of paths
+        
+    Raises:
+        ValueError: If a file type is not supported
+    """
+    if len(paths) < 2:
+        return [read_text_from_path(path) for path in paths]
+    return list(get_pool().map(read_text_from_path, paths))
@@ -1,4 +1,8 @@
+import math
+import multiprocessing
+import os
 import spacy
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Iterable
 from spacy.lang.en.stop_words import STOP_WORDS
 
@@ -9,6 +13,28 @@ nlp = spacy.load("en_core_web_sm")
 NEGATIONS = {"no", "not", "never"}
 CUSTOM_STOPWORDS = {w for w in STOP_WORDS if w not in NEGATIONS}
 
+# Batches at least this large are tokenized in worker processes
+PARALLEL_MIN_TEXTS = 1000
+
+# Worker processes for tokenization, started on first use
+_pool: ProcessPoolExecutor | None = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    Return the process pool used to tokenize large batches.
+    
+    Workers are spawned rather than forked (the server process runs threads) and
+    each loads the spaCy model once, when it first imports this module.
+    
+    Returns:
+        ProcessPoolExecutor: Pool with one worker per CPU
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
 
 def preprocess_doc(doc) -> List[str]:
     """
@@ -61,21 +87,39 @@ def preprocess_text(text: str) -> List[str]:
     return preprocess_doc(doc)
 
 
-def batch_preprocess_texts(texts: Iterable[str]) -> List[List[str]]:
+def batch_preprocess_texts(texts: Iterable[str], parallel: bool = True) -> List[List[str]]:
     """
     Preprocess multiple text strings efficiently using spaCy's batch processing.
     
     This function processes multiple texts in batches for improved performance
     during document indexing operations. It applies the same normalization
-    rules as preprocess_text but handles multiple inputs efficiently.
+    rules as preprocess_text but handles multiple inputs efficiently. Batches of
+    PARALLEL_MIN_TEXTS or more are split into one shard per CPU and tokenized
+    in worker processes.
     
     Args:
         texts (Iterable[str]): Iterable of text strings to preprocess
+        parallel (bool, optional): Allow large batches to use the process pool. Defaults to True.
         
     Returns:
         List[List[str]]: List of token lists, one for each input text
     """
-    results: List[List[str]] = []
+    texts = list(texts)
+    workers = os.cpu_count() or 1
+    if parallel and workers > 1 and len(texts) >= PARALLEL_MIN_TEXTS:
+        shard_size = math.ceil(len(texts) / workers)
+        shards = [texts[i:i + shard_size] for i in range(0, len(texts), shard_size)]
+        results: List[List[str]] = []
+        for shard_tokens in get_pool().map(_preprocess_shard, shards):
+            results.extend(shard_tokens)
+        return results
+
+    results = []
     for doc in nlp.pipe(texts, batch_size=64):
         results.append(preprocess_doc(doc))
-    return results
\ No newline at end of file
+    return results
+
+
+def _preprocess_shard(texts: List[str]) -> List[List[str]]:
+    """Tokenize one shard of a parallel batch inside a worker process."""
+    return batch_preprocess_texts(texts, parallel=False)
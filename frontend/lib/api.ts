@@ -41,11 +41,23 @@ class ApiService {
       formData.append("api_key", apiKey);
     }
 
-    return this.request("/upload", {
+    const { upload_id } = await this.request("/upload", {
       method: "POST",
       headers: {},
       body: formData,
     });
+
+    // Ingestion runs in the background; wait until the document is indexed
+    while (true) {
+      const status = await this.request(`/status/${upload_id}`, { method: "GET" });
+      if (status.status === "done") {
+        return status;
+      }
+      if (status.status === "failed") {
+        throw new Error(status.error || "Failed to process file");
+      }
+      await new Promise((resolve) => setTimeout(resolve, 500));
+    }
   }
 
   async queryDocuments(query: string, sessionId: string, apiKey?: string, k: number = 3) {